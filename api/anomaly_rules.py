@@ -0,0 +1,180 @@
+import itertools
+import json
+import os
+import threading
+
+import numpy as np
+
+# Declarative weather anomaly rules.
+#
+# A rule is {'name', 'column', 'op', 'threshold', 'label'}. A rule set compiles
+# to one comparison per rule over whole column arrays; rule i sets bit i of a
+# per-row mask, and labels come from a table indexed by mask, so evaluating a
+# (city, month) partition is a handful of vectorized comparisons.
+#
+# Thresholds can be overridden per crop or region in a JSON file (WEATHER_RULES,
+# default weather_rules.json), without code changes:
+#   {"rules": [...],                      optional: replaces DEFAULT_RULES
+#    "regions": {"jaipur": {"extreme_heat": {"threshold": 47}}},
+#    "crops": {"rice": {"heavy_rainfall": {"threshold": 25},
+#                       "high_uv": {"enabled": false}}}}
+# Region overrides apply first, then crop overrides.
+DEFAULT_RULES = [
+    {'name': 'extreme_heat', 'column': 'maxtempC', 'op': '>', 'threshold': 45,
+     'label': "🔥 Extreme Heat (crop wilting risk)"},
+    {'name': 'extreme_cold', 'column': 'mintempC', 'op': '<', 'threshold': 5,
+     'label': "❄️ Extreme Cold (frost risk)"},
+    {'name': 'high_humidity', 'column': 'humidity', 'op': '>', 'threshold': 90,
+     'label': "💧 High Humidity (fungal disease risk)"},
+    {'name': 'high_uv', 'column': 'uvIndex', 'op': '>', 'threshold': 10,
+     'label': "☀️ High UV (sunburn on crops)"},
+    {'name': 'heavy_rainfall', 'column': 'precipMM', 'op': '>', 'threshold': 15,
+     'label': "🌧️ Heavy Rainfall (flood risk)"},
+]
+RULES_PATH = os.environ.get("WEATHER_RULES", "weather_rules.json")
+
+OPS = {'>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal,
+       '==': np.equal, '!=': np.not_equal}
+MAX_RULES = 32
+
+
+# One compiled set of rules: comparisons plus the mask -> label table
+class RuleSet:
+    def __init__(self, rules):
+        rules = [rule for rule in rules if rule.get('enabled', True)]
+        if len(rules) > MAX_RULES:
+            raise ValueError(f"At most {MAX_RULES} rules are supported")
+        for rule in rules:
+            if rule['op'] not in OPS:
+                raise ValueError(f"Unknown operator '{rule['op']}' in rule '{rule['name']}'")
+        self.rules = rules
+        self.checks = [(rule['column'], OPS[rule['op']], rule['threshold'], np.uint32(1 << bit))
+                       for bit, rule in enumerate(rules)]
+        self.labels = [rule['label'] for rule in rules]
+        self.columns = sorted({rule['column'] for rule in rules})
+        # Every combination is precomputed for small rule sets, looked up lazily otherwise
+        self._table = (np.array([self._join(mask) for mask in range(1 << len(rules))], dtype=object)
+                       if len(rules) <= 10 else None)
+
+    def _join(self, mask):
+        return ", ".join(label for bit, label in enumerate(self.labels) if mask >> bit & 1)
+
+    # Per-row bitmask over `columns`, a mapping of name -> equal-length arrays
+    def evaluate(self, columns):
+        mask = np.zeros(len(next(iter(columns.values()))), dtype=np.uint32)
+        for column, op, threshold, bit in self.checks:
+            mask |= op(columns[column], threshold) * bit
+        return mask
+
+    # Comma-joined labels for each mask value
+    def label(self, masks):
+        if self._table is not None:
+            return self._table[masks]
+        values, inverse = np.unique(masks, return_inverse=True)
+        return np.array([self._join(int(mask)) for mask in values], dtype=object)[inverse]
+
+    def describe(self):
+        return [{key: rule[key] for key in ('name', 'column', 'op', 'threshold', 'label')}
+                for rule in self.rules]
+
+
+# Base rules plus per-crop/per-region overrides, compiled once per combination
+class RuleEngine:
+    def __init__(self, rules=None, regions=None, crops=None):
+        self.rules = [dict(rule) for rule in (rules or DEFAULT_RULES)]
+        self.regions = {key.strip().lower(): value for key, value in (regions or {}).items()}
+        self.crops = {key.strip().lower(): value for key, value in (crops or {}).items()}
+        self._compiled = {}
+        self.ruleset()  # Fail at startup on an invalid base configuration
+
+    @classmethod
+    def from_file(cls, path=RULES_PATH):
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            config = json.load(f)
+        return cls(config.get('rules'), config.get('regions'), config.get('crops'))
+
+    # Columns read by any configured combination (compiling each of them)
+    def columns(self):
+        return sorted({column for crop in ['', *self.crops] for region in ['', *self.regions]
+                       for column in self.ruleset(crop, region).columns})
+
+    # Check every configured combination only uses known columns
+    def check_columns(self, available):
+        missing = set(self.columns()) - set(available)
+        if missing:
+            raise ValueError(f"Rules refer to unknown columns: {', '.join(sorted(missing))}")
+
+    def ruleset(self, crop=None, region=None):
+        # Names without overrides share the base rules, so the cache stays bounded
+        crop, region = (crop or '').strip().lower(), (region or '').strip().lower()
+        key = (crop if crop in self.crops else '', region if region in self.regions else '')
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            rules = {rule['name']: dict(rule) for rule in self.rules}
+            for overrides in (self.regions.get(key[1], {}), self.crops.get(key[0], {})):
+                for name, changes in overrides.items():
+                    rules.setdefault(name, {'name': name}).update(changes)
+            compiled = self._compiled[key] = RuleSet(list(rules.values()))
+        return compiled
+
+
+# Version numbers of materialized anomaly listings, shared by every listing so
+# that a pagination cursor never matches one it did not come from
+versions = itertools.count(1)
+
+
+# Materialized anomalies of one rule set over a partitioned table.
+# `rows` holds the row numbers that tripped at least one rule, in table order,
+# and `masks` their bitmasks; since the table is sorted by partition, each
+# (city, month) owns a contiguous range of `rows` recorded in `partitions`.
+# Rows appended later (see weather_ingest) are evaluated on their own by
+# extend() and queued per partition behind the base range, so positions within
+# a partition never move and cursors stay valid across ingests.
+class AnomalyTable:
+    def __init__(self, ruleset, columns, partitions):
+        mask = ruleset.evaluate({column: columns[column] for column in ruleset.columns})
+        self.version = next(versions)
+        self.ruleset = ruleset
+        self.rows = np.flatnonzero(mask)
+        self.masks = mask[self.rows]
+        bounds = np.searchsorted(self.rows, np.array(list(partitions.values()), dtype=np.int64).reshape(-1, 2))
+        self.partitions = {key: (int(lo), int(hi)) for key, (lo, hi) in zip(partitions, bounds)}
+        self._appended = {}  # key -> [(rows, masks), ...] not yet merged
+        self._merged = {}  # key -> (rows, masks) of partitions that grew
+        self._lock = threading.Lock()
+
+    # [lo, hi) range of `rows` for a partition key
+    def bounds(self, key):
+        return self.partitions.get(key, (0, 0))
+
+    # Evaluate appended rows `offset + i`; `keys` gives each row's partition
+    def extend(self, columns, keys, offset):
+        mask = self.ruleset.evaluate({column: columns[column] for column in self.ruleset.columns})
+        hits = np.flatnonzero(mask)
+        if not len(hits):
+            return
+        grouped = {}
+        for i in hits.tolist():
+            grouped.setdefault(keys[i], []).append(i)
+        with self._lock:
+            for key, selected in grouped.items():
+                selected = np.array(selected, dtype=np.int64)
+                self._appended.setdefault(key, []).append((selected + offset, mask[selected]))
+
+    # (rows, masks) of one partition, base range first then appended rows
+    def partition(self, key):
+        with self._lock:
+            pieces = self._appended.pop(key, None)
+            if pieces:
+                if key in self._merged:
+                    head = [self._merged[key]]
+                else:
+                    lo, hi = self.bounds(key)
+                    head = [(self.rows[lo:hi], self.masks[lo:hi])]
+                self._merged[key] = tuple(np.concatenate(parts) for parts in zip(*head, *pieces))
+            if key in self._merged:
+                return self._merged[key]
+        lo, hi = self.bounds(key)
+        return self.rows[lo:hi], self.masks[lo:hi]
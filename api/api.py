@@ -1,21 +1,61 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import pickle
 import numpy as np
+import csv
+import io
 import os
 
+from fast_artifacts import export_artifacts, load_artifacts, read_manifest
+from micro_batch import MicroBatcher
+from tree_engine import CompiledForest
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+SCALER_PATH = "ml_components/minmaxscaler.pkl"
+MODEL_PATH = "ml_components/model.pkl"
+FAST_ARTIFACT_DIR = "ml_components/fast"
+
 # Load model and scaler
 def load_ml_components():
-    with open("ml_components/minmaxscaler.pkl", "rb") as f:
+    import pickle  # Unpickling pulls in scikit-learn, so only do it when needed
+    with open(SCALER_PATH, "rb") as f:
         scaler = pickle.load(f)
-    with open("ml_components/model.pkl", "rb") as f:
+    with open(MODEL_PATH, "rb") as f:
         model = pickle.load(f)
     return scaler, model
 
-scaler, model = load_ml_components()
+# The sklearn estimators are only loaded on first use when the fast-start
+# artifacts (see fast_artifacts.py) are available and current
+_sklearn_components = None
+
+def sklearn_components():
+    global _sklearn_components
+    if _sklearn_components is None:
+        _sklearn_components = load_ml_components()
+    return _sklearn_components
+
+# Flattened copy of the forest (see tree_engine.py). NumPy traversal beats the
+# sklearn estimator on small batches; large batches stay on sklearn's C loops.
+# PREDICT_ENGINE=compiled uses it for every batch, =sklearn turns it off.
+PREDICT_ENGINE = os.environ.get("PREDICT_ENGINE", "auto")
+COMPILED_MAX_ROWS = int(os.environ.get("PREDICT_COMPILED_MAX_ROWS", 256))
+
+# Prefer the memory-mapped artifacts; otherwise unpickle and write them so the
+# next cold start (and every other worker on this host) can map them instead
+manifest, artifacts_current = read_manifest(FAST_ARTIFACT_DIR, (SCALER_PATH, MODEL_PATH))
+if PREDICT_ENGINE != "sklearn" and artifacts_current:
+    scaler, compiled_model = load_artifacts(FAST_ARTIFACT_DIR, manifest)
+else:
+    scaler, model = sklearn_components()
+    compiled_model = None
+    if PREDICT_ENGINE != "sklearn":
+        try:
+            export_artifacts(scaler, model, FAST_ARTIFACT_DIR, (SCALER_PATH, MODEL_PATH))
+            scaler, compiled_model = load_artifacts(FAST_ARTIFACT_DIR)
+        except OSError as e:
+            print(f"Could not write fast-start artifacts: {str(e)}")
+            compiled_model = CompiledForest.from_estimator(model)
 
 crop_dict = {
     1: 'rice', 2: 'maize', 3: 'chickpea', 4: 'kidneybeans',
@@ -26,13 +66,93 @@ crop_dict = {
     21: 'jute', 22: 'coffee'
 }
 
+# crop_dict as an array so a whole batch of predictions maps to names in one lookup
+crop_lookup = np.full(max(crop_dict) + 1, "Unknown crop", dtype=object)
+for label, name in crop_dict.items():
+    crop_lookup[label] = name
+
+required_fields = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+# Upper bound on rows accepted by /predict/batch in one request
+MAX_BATCH_ROWS = int(os.environ.get("PREDICT_MAX_BATCH", 100000))
+
+def crop_names(predictions):
+    labels = np.asarray(predictions).astype(int)
+    known = (labels >= 0) & (labels < len(crop_lookup))
+    return np.where(known, crop_lookup[np.where(known, labels, 0)], "Unknown crop")
+
+# Scale and predict a block of rows in one vectorized call
+def predict_crops(input_data):
+    scaled_input = scaler.transform(input_data)
+    if compiled_model is not None and (PREDICT_ENGINE == "compiled"
+                                       or len(scaled_input) <= COMPILED_MAX_ROWS):
+        return crop_names(compiled_model.predict(scaled_input))
+    return crop_names(sklearn_components()[1].predict(scaled_input))
+
+# Optional micro-batching of concurrent /predict calls. Requests arriving within
+# PREDICT_BATCH_WINDOW_MS of each other (up to PREDICT_BATCH_SIZE rows) share one
+# predict_crops call. 0 disables it for strict per-request latency.
+PREDICT_BATCH_WINDOW_MS = float(os.environ.get("PREDICT_BATCH_WINDOW_MS", 0))
+micro_batcher = MicroBatcher(
+    predict_crops,
+    window=PREDICT_BATCH_WINDOW_MS / 1000,
+    max_batch=int(os.environ.get("PREDICT_BATCH_SIZE", 64)),
+) if PREDICT_BATCH_WINDOW_MS > 0 else None
+
+# Parse a batch upload into an (n, 7) float array in required_fields order.
+# Accepts a CSV file (multipart field "file" or a text/csv body) with a header
+# row, or JSON with "samples" as objects or 7-value arrays. Missing,
+# non-numeric or non-finite values are rejected, naming the CSV line or sample.
+def parse_batch(req):
+    upload = req.files.get('file')
+    if upload is not None or req.mimetype == 'text/csv':
+        text = upload.read().decode('utf-8-sig') if upload is not None else req.get_data(as_text=True)
+        reader = csv.reader(io.StringIO(text))
+        header = [name.strip() for name in next(reader, [])]
+        missing = [field for field in required_fields if field not in header]
+        if missing:
+            raise ValueError(f"CSV is missing columns: {', '.join(missing)}")
+        columns = [header.index(field) for field in required_fields]
+        rows, lines = [], []
+        for row in reader:
+            if not row:
+                continue
+            if len(row) <= max(columns):
+                raise ValueError(f"CSV line {reader.line_num} has {len(row)} of {len(header)} columns")
+            rows.append([row[i] for i in columns])
+            lines.append(reader.line_num)
+        input_data = np.array(rows, dtype=float).reshape(-1, len(required_fields))
+        bad = np.flatnonzero(~np.isfinite(input_data).all(axis=1))
+        if len(bad):
+            raise ValueError(f"Invalid value on CSV line {lines[bad[0]]}")
+        return input_data
+
+    data = req.get_json(silent=True)
+    samples = data.get('samples') if isinstance(data, dict) else data
+    if not isinstance(samples, list):
+        raise ValueError("Expected a JSON list of samples or a CSV upload")
+    if samples and isinstance(samples[0], dict):
+        missing = [i for i, sample in enumerate(samples)
+                   if not isinstance(sample, dict) or not all(field in sample for field in required_fields)]
+        if missing:
+            raise ValueError(f"Missing required fields in sample {missing[0]}")
+        samples = [[sample[field] for field in required_fields] for sample in samples]
+    if not samples:
+        return np.empty((0, len(required_fields)))
+    input_data = np.array(samples, dtype=float).reshape(len(samples), -1)
+    if input_data.shape[1] != len(required_fields):
+        raise ValueError(f"Each sample needs {len(required_fields)} values: {', '.join(required_fields)}")
+    bad = np.flatnonzero(~np.isfinite(input_data).all(axis=1))
+    if len(bad):
+        raise ValueError(f"Invalid value in sample {bad[0]}")
+    return input_data
+
 @app.route('/predict', methods=['POST'])
 def predict():
     try:
         data = request.json
         
         # Validate input
-        required_fields = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
         if not all(field in data for field in required_fields):
             return jsonify({'error': 'Missing required fields'}), 400
 
@@ -47,10 +167,11 @@ def predict():
             float(data['rainfall'])
         ]])
 
-        # Scale and predict
-        scaled_input = scaler.transform(input_data)
-        prediction = model.predict(scaled_input)
-        crop_name = crop_dict.get(int(prediction[0]), "Unknown crop")
+        # Scale and predict, coalesced with concurrent requests when enabled
+        if micro_batcher is not None:
+            crop_name = micro_batcher.predict(input_data[0], timeout=30)
+        else:
+            crop_name = predict_crops(input_data)[0]
 
         return jsonify({
             'prediction': crop_name,
@@ -63,6 +184,41 @@ def predict():
             'status': 'error'
         }), 500
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    try:
+        input_data = parse_batch(request)
+    except (ValueError, TypeError, IndexError) as e:
+        return jsonify({'error': f"Invalid batch: {str(e)}", 'status': 'error'}), 400
+
+    if len(input_data) > MAX_BATCH_ROWS:
+        return jsonify({'error': f"At most {MAX_BATCH_ROWS} rows per batch", 'status': 'error'}), 400
+    if len(input_data) == 0:
+        return jsonify({'predictions': [], 'count': 0, 'status': 'success'})
+
+    try:
+        # Scale and predict the whole batch in one vectorized call
+        predictions = predict_crops(input_data)
+
+        return jsonify({
+            'predictions': predictions.tolist(),
+            'count': len(predictions),
+            'status': 'success'
+        })
+
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 500
+
+@app.route('/predict/stats', methods=['GET'])
+def predict_stats():
+    return jsonify({
+        'micro_batching': micro_batcher.stats() if micro_batcher is not None else None,
+        'status': 'success'
+    })
+
 @app.route('/')
 def home():
     return "Crop Prediction API is running!"
@@ -1,82 +1,121 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
-import pandas as pd
 import numpy as np
 import os
 
+from price_trends import PriceTrends, load_prices
+
 app = Flask(__name__)
 CORS(app)
 
 # Load data
 csv_path = os.path.join(os.path.dirname(__file__), 'crop_prices.csv')
 
-df = pd.read_csv(csv_path)
-df.columns = df.columns.str.strip()
-df = df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+df = load_prices(csv_path)
+
+# Every (crop, state) trend is fitted once at load and its next-season
+# prediction pre-serialized, so a request is a dict lookup
+trends = PriceTrends(df)
+next_season = trends.predict()
+predictions = {key: app.json.dumps(trends.record(i, next_season[i])) for key, i in trends.index.items()}
+
+# Crops and states that have a price series, from the data
+crop_names = sorted(set(trends.crops.tolist()))
+state_names = sorted(set(trends.states.tolist()))
+crops_json = app.json.dumps(crop_names)
+states_json = app.json.dumps(state_names)
 
 @app.route('/api/price/predict', methods=['POST'])
 def predict_price():
-    req_data = request.get_json()
-    print("Incoming prediction request:", req_data)
+    req_data = request.get_json() or {}
     crop = req_data.get('crop')
     state = req_data.get('state', 'Punjab')
 
     if not crop:
         return jsonify({"error": "Missing 'crop' in request"}), 400
 
-    crop_data = df[(df['Crop'] == crop) & (df['State'] == state)]
+    body = predictions.get((str(crop).strip(), str(state).strip()))
 
-    if crop_data.empty:
+    if body is None:
         return jsonify({"error": f"No data for crop '{crop}' in state '{state}'"}), 404
 
-    years = ['2019-20', '2020-21', '2021-22', '2022-23']
+    return app.response_class(body, mimetype='application/json')
+
+# Forecasts for many series at once: one crop (or a list) across all of its
+# states, optionally narrowed to some states, or every crop x state pair.
+#   {"crop": "Wheat", "horizon": 3}
+#   {"crop": ["Wheat", "Paddy"], "state": ["Punjab"], "layout": "matrix"}
+# Only (crop, state) pairs present in the data are returned; in the matrix
+# layout missing pairs are null.
+MAX_HORIZON = int(os.environ.get("PRICE_MAX_HORIZON", "10"))
+
+# Requested names (a string or a list of strings), de-duplicated in order;
+# all of `known` when none are given
+def selection(value, known, name):
+    if value is None:
+        value = []
+    values = [value] if isinstance(value, str) else value
+    if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+        raise ValueError(f"'{name}' must be a string or a list of strings")
+    values = list(dict.fromkeys(v.strip() for v in values))
+    return values or list(known)
+
+@app.route('/api/price/forecast', methods=['POST'])
+def forecast_prices():
+    req_data = request.get_json() or {}
     try:
-        prices = crop_data.iloc[0][years].values.astype(float)
-    except Exception as e:
-        return jsonify({"error": "Error reading prices", "details": str(e)}), 500
-
-    x = np.arange(len(years))
-    y = prices
-    coeffs = np.polyfit(x, y, 1)
-    predicted = round(coeffs[0] * len(years) + coeffs[1], 2)
-    trend = "increasing" if coeffs[0] > 0 else "decreasing"
-
-    print("Prediction response:", {
-        "crop": crop,
-        "state": state,
-        "predicted_price": predicted,
-        "trend": trend,
-    })
+        horizon = int(req_data.get('horizon', 1))
+    except (TypeError, ValueError):
+        horizon = 0
+    if not 1 <= horizon <= MAX_HORIZON:
+        return jsonify({"error": f"'horizon' must be between 1 and {MAX_HORIZON}"}), 400
+    layout = req_data.get('layout', 'list')
+    if layout not in ('list', 'matrix'):
+        return jsonify({"error": "'layout' must be 'list' or 'matrix'"}), 400
+
+    try:
+        crops = selection(req_data.get('crop'), crop_names, 'crop')
+        states = selection(req_data.get('state'), state_names, 'state')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    rows = np.flatnonzero(np.isin(trends.crops, crops) & np.isin(trends.states, states))
+    prices = np.round(trends.forecast(rows, horizon), 2)
+    seasons = trends.seasons(horizon)
+
+    if layout == 'matrix':
+        crops = [crop for crop in crops if crop in crop_names]
+        states = [state for state in states if state in state_names]
+        matrix = np.full((len(crops), len(states), horizon), np.nan)
+        crop_pos = {crop: i for i, crop in enumerate(crops)}
+        state_pos = {state: i for i, state in enumerate(states)}
+        matrix[[crop_pos[crop] for crop in trends.crops[rows]],
+               [state_pos[state] for state in trends.states[rows]]] = prices
+        return jsonify({
+            "crops": crops,
+            "states": states,
+            "seasons": seasons,
+            "prices": np.where(np.isnan(matrix), None, matrix).tolist(),
+            "currency": "INR/quintal"
+        })
 
-    
-    
     return jsonify({
-        "crop": crop,
-        "state": state,
-        "predicted_price": predicted,
-        "trend": trend,
-        "historical_prices": dict(zip(years, prices.tolist())),
+        "seasons": seasons,
+        "forecasts": [
+            {"crop": crop, "state": state, "trend": "increasing" if slope > 0 else "decreasing",
+             "predicted_prices": values}
+            for crop, state, slope, values in zip(trends.crops[rows].tolist(), trends.states[rows].tolist(),
+                                                 trends.slope[rows].tolist(), prices.tolist())
+        ],
         "currency": "INR/quintal"
     })
 
 @app.route('/api/price/states', methods=['GET'])
 def get_states():
-   return jsonify([
-        "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", 
-        "Goa", "Gujarat", "Haryana", "Himachal Pradesh", "Jharkhand", "Karnataka", 
-        "Kerala", "Madhya Pradesh", "Maharashtra", "Manipur", "Meghalaya", 
-        "Mizoram", "Nagaland", "Odisha", "Punjab", "Rajasthan", "Sikkim", 
-        "Tamil Nadu", "Telangana", "Tripura", "Uttar Pradesh", "Uttarakhand", 
-        "West Bengal"
-    ])
+    return app.response_class(states_json, mimetype='application/json')
 
 @app.route('/api/price/crops', methods=['GET'])
 def get_crops():
-  return jsonify([
-        "Wheat", "Rice", "Maize", "Barley", "Jowar", "Bajra", "Millets", 
-        "Sugarcane", "Cotton", "Pulses", "Lentil", "Chickpea", "Soybean", 
-        "Groundnut", "Mustard", "Sunflower", "Tea", "Coffee", "Tobacco"
-    ])
+    return app.response_class(crops_json, mimetype='application/json')
 
 # 🔥 Main entry point
 if __name__ == '__main__':
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+# Directories published with an atomic swap.
+#
+# `out_dir` is a symlink to a sibling `.<name>-v-<id>` directory holding one
+# complete version. A publisher fills a private staging directory, renames it
+# to a version name and replaces the link with a rename, so readers see the
+# old or the new version and never a missing or partial one. Publishers that
+# race (e.g. several workers starting on a stale store) each swap in their own
+# version and the last one wins; none of them fails. Readers resolve the link
+# once (resolve()) and read every file of one version from there. A replaced
+# version is kept for RETIRE_SECONDS after the swap, for readers that resolved
+# it just before, and removed by a later publish.
+RETIRE_SECONDS = 60
+
+
+def _parts(out_dir):
+    return os.path.split(os.path.abspath(out_dir))
+
+
+# Private directory to build the next version in
+def staging(out_dir):
+    parent, name = _parts(out_dir)
+    path = tempfile.mkdtemp(dir=parent, prefix=f".{name}-staging-")
+    os.chmod(path, 0o755)
+    return path
+
+
+# The version directory `out_dir` currently points to
+def resolve(out_dir):
+    return os.path.realpath(out_dir)
+
+
+def publish(staged, out_dir):
+    parent, name = _parts(out_dir)
+    out_dir = os.path.join(parent, name)
+    version = os.path.join(parent, f".{name}-v-{uuid.uuid4().hex}")
+    os.rename(staged, version)
+
+    previous = resolve(out_dir) if os.path.lexists(out_dir) else None
+    if os.path.isdir(out_dir) and not os.path.islink(out_dir):
+        # A plain directory from before versioned publishing becomes a version
+        previous = os.path.join(parent, f".{name}-v-{uuid.uuid4().hex}")
+        try:
+            os.rename(out_dir, previous)
+        except OSError:
+            pass  # Another publisher moved it first
+
+    link = os.path.join(parent, f".{name}-link-{uuid.uuid4().hex}")
+    os.symlink(os.path.basename(version), link)
+    os.replace(link, out_dir)
+
+    # Mark when the old version was retired, then drop long-retired ones
+    if previous is not None and os.path.isdir(previous):
+        os.utime(previous)
+    current = resolve(out_dir)
+    for entry in os.listdir(parent):
+        path = os.path.join(parent, entry)
+        if not entry.startswith(f".{name}-v-") or path in (version, current):
+            continue
+        try:
+            if time.time() - os.stat(path).st_mtime > RETIRE_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass  # Removed by another publisher
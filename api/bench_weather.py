@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+import numpy as np
+
+# Concurrency benchmark for the weather anomaly service.
+#
+# Start the server (python weather_anomaly.py), then:
+#   python bench_weather.py --url http://127.0.0.1:8004 --clients 1 4 16 64
+#
+# For each level, that many clients POST /detect-anomalies back to back while a
+# probe polls GET / once every 10 ms. If the loop never blocks on data work,
+# both p99 columns stay flat as clients increase; only throughput saturates.
+# Run the client on other cores (or another host) than the server, otherwise
+# the numbers measure the two competing for CPU.
+
+
+def percentiles(samples):
+    ms = np.asarray(samples) * 1000
+    return np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+async def client(http, url, payloads, deadline, latencies):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await http.post(f"{url}/detect-anomalies", json=random.choice(payloads))
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+
+async def probe(http, url, deadline, latencies):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await http.get(f"{url}/")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+
+
+async def run_level(url, clients, seconds, payloads):
+    limits = httpx.Limits(max_connections=clients + 1)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as http:
+        deadline = time.perf_counter() + seconds
+        latencies, probe_latencies = [], []
+        await asyncio.gather(
+            probe(http, url, deadline, probe_latencies),
+            *(client(http, url, payloads, deadline, latencies) for _ in range(clients)),
+        )
+    return latencies, probe_latencies
+
+
+async def main(args):
+    payloads = [
+        {'city': city, 'month': month, 'season': 'Kharif', 'cropType': 'Rice'}
+        for city in args.cities for month in range(1, 13)
+    ]
+    print(f"{'clients':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'probe p50':>10} {'probe p99':>10}")
+    for clients in args.clients:
+        latencies, probe_latencies = await run_level(args.url, clients, args.seconds, payloads)
+        p50, p99 = percentiles(latencies)
+        probe50, probe99 = percentiles(probe_latencies)
+        print(f"{clients:>8} {len(latencies) / args.seconds:>9.0f} {p50:>8.2f} {p99:>8.2f} "
+              f"{probe50:>10.2f} {probe99:>10.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="p50/p99 latency of /detect-anomalies under parallel clients")
+    parser.add_argument('--url', default="http://127.0.0.1:8004")
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--cities', nargs='+', default=['Delhi', 'Mumbai', 'Pune'])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,178 @@
+import datetime
+
+import numpy as np
+
+# Per-(city, month, hour) climatology of the weather table.
+#
+# One grouped pass: every row gets a group id (city, month, hour); counts, means
+# and squared deviations (M2) come from np.bincount, percentiles from a single
+# lexsort by (group, value) with interpolation at each group's offsets. Results
+# are dense arrays indexed [city, month - 1, hour, column], so answering a
+# request is an array lookup.
+#
+# Count, mean and M2 are mergeable moments: update() folds a batch of new
+# observations in with the parallel (Chan et al.) form of Welford's update, at
+# a cost proportional to the batch. Percentiles are not mergeable and keep the
+# values of the last full build.
+STAT_COLUMNS = ('maxtempC', 'mintempC', 'humidity', 'precipMM')
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+# Per-group (count, mean, M2) of `values`, ignoring NaNs; two passes for stability
+def grouped_moments(groups, values, size):
+    valid = ~np.isnan(values)
+    groups, values = groups[valid], values[valid]
+    n = np.bincount(groups, minlength=size).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(groups, weights=values, minlength=size) / n
+    m2 = np.bincount(groups, weights=(values - mean[groups]) ** 2, minlength=size)
+    return n, mean, m2
+
+
+def hours_of(stamps):
+    return np.asarray(stamps).astype('datetime64[h]').astype(np.int64) % 24
+
+
+class Climatology:
+    def __init__(self, index, columns=STAT_COLUMNS):
+        frame = index.frame
+        self.columns = [column for column in columns if column in frame.columns]
+        self.city_codes = {str(key): code for code, key in enumerate(frame['city_key'].cat.categories)}
+
+        cities = frame['city_key'].cat.codes.to_numpy().astype(np.int64)
+        months = frame['month'].to_numpy().astype(np.int64) - 1
+        groups = (cities * 12 + months) * 24 + hours_of(frame['date_time'].to_numpy())
+        shape = (len(self.city_codes), 12, 24)
+        size = int(np.prod(shape))
+
+        count = np.empty((size, len(self.columns)))
+        mean = np.full((size, len(self.columns)), np.nan)
+        m2 = np.zeros((size, len(self.columns)))
+        percentiles = np.full((len(PERCENTILES), size, len(self.columns)), np.nan)
+        for j, column in enumerate(self.columns):
+            values = frame[column].to_numpy(dtype=float)
+            n, mean[:, j], m2[:, j] = grouped_moments(groups, values, size)
+            count[:, j] = n
+
+            # Within-group order by value; NaNs sort to the end of their group
+            ordered = values[np.lexsort((values, groups))]
+            starts = np.concatenate(([0], np.cumsum(np.bincount(groups, minlength=size))[:-1]))
+            has_data = n > 0
+            for p, q in enumerate(PERCENTILES):
+                position = starts[has_data] + (n[has_data] - 1) * q / 100
+                lo = np.floor(position).astype(np.int64)
+                hi = np.ceil(position).astype(np.int64)
+                percentiles[p, has_data, j] = ordered[lo] + (ordered[hi] - ordered[lo]) * (position - lo)
+
+        self.count = count.reshape(*shape, -1)
+        self.mean = mean.reshape(*shape, -1)
+        self.m2 = m2.reshape(*shape, -1)
+        self.std = self._std(self.count, self.m2)
+        self.percentiles = percentiles.reshape(len(PERCENTILES), *shape, -1)
+
+    @staticmethod
+    def _std(count, m2):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(count >= 2, np.sqrt(m2 / (count - 1)), np.nan)
+
+    # Room for cities first seen in an ingested batch
+    def _add_cities(self, keys):
+        new = [key for key in dict.fromkeys(keys) if key not in self.city_codes]
+        if not new:
+            return
+        for key in new:
+            self.city_codes[key] = len(self.city_codes)
+        extra = (len(new), *self.count.shape[1:])
+        self.count = np.concatenate([self.count, np.zeros(extra)])
+        self.mean = np.concatenate([self.mean, np.full(extra, np.nan)])
+        self.m2 = np.concatenate([self.m2, np.zeros(extra)])
+        self.std = np.concatenate([self.std, np.full(extra, np.nan)])
+        self.percentiles = np.concatenate(
+            [self.percentiles, np.full((len(PERCENTILES), *extra), np.nan)], axis=1)
+
+    # Merge a batch of observations (city_key, month, date_time + stat columns)
+    # into the running moments; touches only the groups present in the batch
+    def update(self, frame):
+        if frame.empty:
+            return
+        keys = frame['city_key'].astype(str).to_numpy()
+        self._add_cities(keys)
+        shape = self.count.shape[:3]
+        size = int(np.prod(shape))
+        uniques, inverse = np.unique(keys, return_inverse=True)
+        cities = np.array([self.city_codes[key] for key in uniques], dtype=np.int64)[inverse]
+        months = frame['month'].to_numpy().astype(np.int64) - 1
+        groups = (cities * 12 + months) * 24 + hours_of(frame['date_time'].to_numpy())
+        touched = np.unique(groups)
+
+        count, mean, m2 = (array.reshape(size, -1) for array in (self.count, self.mean, self.m2))
+        for j, column in enumerate(self.columns):
+            if column not in frame.columns:
+                continue
+            n_b, mean_b, m2_b = (part[touched] for part in
+                                 grouped_moments(groups, frame[column].to_numpy(dtype=float), size))
+            n_a, mean_a, m2_a = count[touched, j], np.nan_to_num(mean[touched, j]), m2[touched, j]
+            n = n_a + n_b
+            with np.errstate(invalid='ignore', divide='ignore'):
+                delta = np.nan_to_num(mean_b) - mean_a
+                merged_mean = np.where(n_b > 0, mean_a + delta * n_b / n, mean[touched, j])
+                merged_m2 = np.where(n_b > 0, m2_a + np.nan_to_num(m2_b) + delta ** 2 * n_a * n_b / n, m2_a)
+            count[touched, j], mean[touched, j], m2[touched, j] = n, merged_mean, merged_m2
+        self.std.reshape(size, -1)[touched] = self._std(count[touched], m2[touched])
+
+    # Average of `column` over all observations of a (city, month)
+    def monthly_mean(self, city, month, column):
+        code = self.city_codes.get(city)
+        if code is None or column not in self.columns:
+            return None
+        j = self.columns.index(column)
+        n = self.count[code, month - 1, :, j]
+        if n.sum() == 0:
+            return None
+        return float(np.nansum(self.mean[code, month - 1, :, j] * n) / n.sum())
+
+    # (mean, std, {percentile: value}) of one column at (city, month, hour), or None
+    def stats(self, city, month, hour, column):
+        code = self.city_codes.get(city)
+        if code is None or column not in self.columns:
+            return None
+        j = self.columns.index(column)
+        if self.count[code, month - 1, hour, j] == 0:
+            return None
+        return (self.mean[code, month - 1, hour, j], self.std[code, month - 1, hour, j],
+                {q: self.percentiles[p, code, month - 1, hour, j] for p, q in enumerate(PERCENTILES)})
+
+    # z-score of `value` and whether it falls outside the [low, high] percentiles
+    def score(self, city, month, hour, column, value, low=5, high=95):
+        stats = self.stats(city, month, hour, column)
+        if stats is None:
+            return None
+        mean, std, percentiles = stats
+        z = (value - mean) / std if std > 0 else None
+        return {
+            'zScore': None if z is None else round(float(z), 2),
+            'normal': round(float(mean), 2),
+            'belowPercentile': bool(value < percentiles[low]),
+            'abovePercentile': bool(value > percentiles[high]),
+        }
+
+    # Baseline forecast for `days` days after `last_day`: per day, the mean over
+    # its hours of each of `columns`, from the climatology of that day's month
+    # (falling back to `month` if it is empty). Values are hourly, on the same
+    # scale as a single reading.
+    def daily_baseline(self, city, month, last_day, days=7, columns=('maxtempC', 'precipMM')):
+        code = self.city_codes.get(city)
+        if code is None:
+            return []
+        forecast = []
+        for offset in range(1, days + 1):
+            day = last_day + datetime.timedelta(days=offset)
+            hourly = self.mean[code, day.month - 1]
+            if not self.count[code, day.month - 1].any():
+                hourly = self.mean[code, month - 1]
+            entry = {'date': day.isoformat()}
+            for column in columns:
+                if column in self.columns:
+                    entry[column] = round(float(np.nanmean(hourly[:, self.columns.index(column)])), 2)
+            forecast.append(entry)
+        return forecast
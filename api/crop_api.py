@@ -2,26 +2,35 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS  # Add CORS support
 import pandas as pd
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import hashlib
+import hmac
+import io
+import json
 import os
+import threading
+import time
+
+from query_cache import QueryCache
+from recommend_index import RecommendationIndex
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+CATALOG_PATH = os.environ.get("CATALOG_PATH", "merged_hybrid_crops.csv")
+
 # Load and preprocess data
-def load_data():
+def load_data(source=CATALOG_PATH):
+    required_columns = ["Crop", "Hybrid", "Benefit1", "Benefit2", "Benefit3",
+                      "Region", "Duration", "Yield", "DiseaseResistance",
+                      "SpecialFeatures", "Vendors"]
     try:
-        df = pd.read_csv("merged_hybrid_crops.csv")
+        df = pd.read_csv(source)
 
         # Data cleaning
         df = df.drop_duplicates(subset=["Crop", "Hybrid"])
         df.fillna("Not Specified", inplace=True)
 
         # Ensure required columns exist
-        required_columns = ["Crop", "Hybrid", "Benefit1", "Benefit2", "Benefit3",
-                          "Region", "Duration", "Yield", "DiseaseResistance",
-                          "SpecialFeatures", "Vendors"]
-
         for col in required_columns:
             if col not in df.columns:
                 df[col] = "Not Specified"
@@ -37,46 +46,259 @@ def load_data():
         print(f"Error loading data: {str(e)}")
         return pd.DataFrame(columns=required_columns)
 
+# Upper bound on queries accepted by /api/recommend/batch in one request
+MAX_BATCH_QUERIES = int(os.environ.get("RECOMMEND_MAX_BATCH", 10000))
+
+# Optional approximate nearest-neighbour (IVF) index for large catalogs, see
+# IVFIndex. More probes raise recall and latency; crop slices smaller than
+# RECOMMEND_ANN_EXACT_BELOW rows are always scored exactly.
+ANN_CONFIG = {
+    'n_components': int(os.environ.get("RECOMMEND_ANN_COMPONENTS", 64)),
+    'n_lists': int(os.environ.get("RECOMMEND_ANN_LISTS", 0)) or None,
+    'nprobe': int(os.environ.get("RECOMMEND_ANN_NPROBE", 32)),
+    'exact_below': int(os.environ.get("RECOMMEND_ANN_EXACT_BELOW", 50000)),
+} if os.environ.get("RECOMMEND_ANN", "0") == "1" else None
+
+# Build a complete recommendation index from raw catalog bytes.
+# Nothing here touches the live index, so it is safe to run in the background.
+def build_index(raw):
+    df = load_data(io.BytesIO(raw))
+    if df.empty:
+        raise ValueError("Catalog is empty or could not be parsed")
+    vectorizer = TfidfVectorizer(stop_words='english')
+    tfidf_matrix = vectorizer.fit_transform(df["Search_Features"])
+    index = RecommendationIndex(df, vectorizer, tfidf_matrix, ann=ANN_CONFIG)
+    index.digest = hashlib.sha256(raw).hexdigest()
+    index.loaded_at = time.time()
+    return index
+
 # Load data and train model
 print("Loading data and training model...")
-df = load_data()
-vectorizer = TfidfVectorizer(stop_words='english')
-tfidf_matrix = vectorizer.fit_transform(df["Search_Features"])
+with open(CATALOG_PATH, "rb") as f:
+    rec_index = build_index(f.read())
 print("Model training completed!")
 
+# Serialized /api/recommend responses keyed on the catalog version and the
+# normalized query, so repeated UI queries skip scikit-learn entirely
+rec_cache = QueryCache(
+    max_entries=int(os.environ.get("RECOMMEND_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("RECOMMEND_CACHE_TTL", 300)),
+)
+
+# TF-IDF lowercases and tokenizes on words, so case and spacing never change results
+def normalize_query(user_input):
+    return " ".join(user_input.lower().split())
+
+# Wrap a pre-encoded JSON array in the usual {"success": true, "data": ...} envelope
+def records_response(data_json):
+    body = b'{"success":true,"data":' + data_json + b"}"
+    return app.response_class(body, mimetype='application/json')
+
+# `fields` names one of the projections (a string; lists and other JSON values are not)
+def valid_fields(fields):
+    return isinstance(fields, str) and fields in RecommendationIndex.PROJECTIONS
+
+def invalid_fields_response(fields):
+    return jsonify({
+        'success': False,
+        'error': f"Unknown fields '{fields}', expected one of {sorted(RecommendationIndex.PROJECTIONS)}"
+    }), 400
+
+# Catalog hot reload. A new index is built off to the side and published with a
+# single reference assignment, so readers see either the old index or the new
+# one, never a half-built one. Handlers read `rec_index` once per request.
+reload_lock = threading.Lock()
+reload_status = {'state': 'idle', 'last_error': None, 'last_checked': None}
+
+def reload_catalog(force=False):
+    global rec_index
+    with reload_lock:
+        reload_status['state'] = 'running'
+        reload_status['last_checked'] = time.time()
+        try:
+            with open(CATALOG_PATH, "rb") as f:
+                raw = f.read()
+            # Refit only when the file contents actually changed
+            if not force and hashlib.sha256(raw).hexdigest() == rec_index.digest:
+                reload_status.update(state='idle', last_error=None)
+                return False
+            new_index = build_index(raw)
+            rec_index = new_index
+            rec_cache.clear()
+            reload_status.update(state='idle', last_error=None)
+            print(f"Catalog reloaded: {len(new_index)} hybrids (version {new_index.version})")
+            return True
+        except Exception as e:
+            reload_status.update(state='failed', last_error=str(e))
+            print(f"Error reloading catalog: {str(e)}")
+            return False
+
+def catalog_info():
+    index = rec_index
+    return {
+        'version': index.version,
+        'digest': index.digest,
+        'rows': len(index),
+        'loaded_at': index.loaded_at,
+        **reload_status,
+    }
+
+# File watch, the default reload path: poll the catalog's mtime/size every
+# CATALOG_WATCH_INTERVAL seconds and reload in the background when it changes
+# (0 disables)
+CATALOG_WATCH_INTERVAL = float(os.environ.get("CATALOG_WATCH_INTERVAL", 5))
+
+def watch_catalog(interval):
+    last_seen = None
+    while True:
+        try:
+            stat = os.stat(CATALOG_PATH)
+            seen = (stat.st_mtime_ns, stat.st_size)
+            if last_seen is not None and seen != last_seen:
+                reload_catalog()
+            last_seen = seen
+        except OSError as e:
+            print(f"Error watching catalog: {str(e)}")
+        time.sleep(interval)
+
+if CATALOG_WATCH_INTERVAL > 0:
+    threading.Thread(target=watch_catalog, args=(CATALOG_WATCH_INTERVAL,), daemon=True).start()
+
 @app.route('/api/recommend', methods=['POST'])
 def recommend():
     data = request.json
     user_input = data.get('user_input')
     selected_crop = data.get('selected_crop', 'All')
+    approximate = bool(data.get('approximate', ANN_CONFIG is not None))
+    nprobe = data.get('nprobe')
+    fields = data.get('fields', 'full')
+    if not valid_fields(fields):
+        return invalid_fields_response(fields)
+    if nprobe is not None and (not isinstance(nprobe, int) or isinstance(nprobe, bool) or nprobe < 1):
+        return jsonify({
+            'success': False,
+            'error': "'nprobe' must be a positive integer"
+        }), 400
     
     try:
-        if selected_crop != "All":
-            crop_filtered_df = df[df["Crop"] == selected_crop]
-        else:
-            crop_filtered_df = df.copy()
+        index = rec_index
+        query = normalize_query(user_input) if isinstance(user_input, str) else user_input
+        cache_key = (index.version, query, selected_crop, approximate, nprobe, fields)
+        data_json = rec_cache.get(cache_key)
 
-        query_vec = vectorizer.transform([user_input])
-        similarities = cosine_similarity(
-            query_vec,
-            vectorizer.transform(crop_filtered_df["Search_Features"])
-        ).flatten()
+        if data_json is None:
+            rows, scores = index.top_rows(query, selected_crop, top_k=5,
+                                          approximate=approximate, nprobe=nprobe)
+            data_json = index.records_json(rows, scores, fields)
+            rec_cache.put(cache_key, data_json)
 
-        crop_filtered_df["Match_Score"] = similarities
-        recommendations = crop_filtered_df.sort_values("Match_Score", ascending=False).head(5)
-        
+        return records_response(data_json)
+    except Exception as e:
         return jsonify({
-            'success': True,
-            'data': recommendations.to_dict(orient='records')
+            'success': False,
+            'error': str(e)
         })
+
+@app.route('/api/recommend/batch', methods=['POST'])
+def recommend_batch():
+    data = request.json or {}
+    raw_queries = data.get('queries', [])
+    top_k = data.get('top_k', 5)
+    fields = data.get('fields', 'full')
+
+    # Accept {"user_input": ..., "selected_crop": ...} objects or [user_input, selected_crop] pairs
+    queries = []
+    for item in raw_queries if isinstance(raw_queries, list) else []:
+        if isinstance(item, dict):
+            queries.append((item.get('user_input'), item.get('selected_crop', 'All')))
+        elif isinstance(item, (list, tuple)) and len(item) in (1, 2):
+            queries.append((item[0], item[1] if len(item) == 2 else 'All'))
+        else:
+            queries = None
+            break
+
+    if not queries or not all(isinstance(user_input, str) for user_input, _ in queries):
+        return jsonify({
+            'success': False,
+            'error': "'queries' must be a non-empty list of (user_input, selected_crop) pairs"
+        }), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({
+            'success': False,
+            'error': f"At most {MAX_BATCH_QUERIES} queries per batch"
+        }), 400
+    if not isinstance(top_k, int) or top_k < 1:
+        return jsonify({
+            'success': False,
+            'error': "'top_k' must be a positive integer"
+        }), 400
+    if not valid_fields(fields):
+        return invalid_fields_response(fields)
+
+    try:
+        index = rec_index
+        results = index.top_rows_batch(queries, top_k=top_k)
+
+        items = [
+            json.dumps({'selected_crop': selected_crop, 'user_input': user_input},
+                       separators=(",", ":"))[:-1].encode()
+            + b',"recommendations":' + index.records_json(rows, scores, fields) + b"}"
+            for (user_input, selected_crop), (rows, scores) in zip(queries, results)
+        ]
+        return records_response(b"[" + b",".join(items) + b"]")
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         })
 
+@app.route('/api/recommend/cache', methods=['GET'])
+def recommend_cache_stats():
+    return jsonify({
+        'success': True,
+        'data': rec_cache.stats()
+    })
+
+# Admin reload: rebuilds in a background thread and returns immediately,
+# or blocks until the new index is live when called with {"wait": true}.
+# Disabled unless CATALOG_ADMIN_TOKEN is set; callers send it as X-Admin-Token.
+# Without it, catalog changes are picked up by the file watch only.
+@app.route('/api/admin/reload', methods=['POST'])
+def admin_reload():
+    token = os.environ.get("CATALOG_ADMIN_TOKEN")
+    if not token:
+        return jsonify({'success': False, 'error': 'Admin reload is disabled (CATALOG_ADMIN_TOKEN is not set)'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+
+    data = request.get_json(silent=True) or {}
+    force = bool(data.get('force', False))
+
+    if data.get('wait'):
+        reloaded = reload_catalog(force=force)
+        return jsonify({
+            'success': reload_status['last_error'] is None,
+            'reloaded': reloaded,
+            'data': catalog_info()
+        })
+
+    threading.Thread(target=reload_catalog, kwargs={'force': force}, daemon=True).start()
+    return jsonify({
+        'success': True,
+        'reloaded': None,
+        'data': catalog_info()
+    }), 202
+
+@app.route('/api/admin/catalog', methods=['GET'])
+def admin_catalog():
+    return jsonify({
+        'success': True,
+        'data': catalog_info()
+    })
+
 @app.route('/api/data', methods=['GET'])
 def get_data():
+    df = rec_index.frame
     try:
         return jsonify({
             'success': True,
@@ -97,21 +319,15 @@ def compare():
     selected_crop = data.get('selected_crop', 'All')
     selected_region = data.get('selected_region', 'All')
     hybrids = data.get('hybrids', [])
+    fields = data.get('fields', 'full')
+    if not valid_fields(fields):
+        return invalid_fields_response(fields)
 
     try:
-        filtered_df = df.copy()
-        if selected_crop != "All":
-            filtered_df = filtered_df[filtered_df["Crop"] == selected_crop]
-        if selected_region != "All":
-            filtered_df = filtered_df[filtered_df["Region"].str.contains(selected_region, case=False)]
-        
-        if hybrids:
-            filtered_df = filtered_df[filtered_df["Hybrid"].isin(hybrids)]
+        index = rec_index
+        rows = index.filter_rows(selected_crop, selected_region, hybrids)
         
-        return jsonify({
-            'success': True,
-            'data': filtered_df.to_dict(orient='records')
-        })
+        return records_response(index.records_json(rows, fields=fields))
     except Exception as e:
         return jsonify({
             'success': False,
@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+import atomic_dir
+from tree_engine import CompiledForest
+
+# Fast-start artifact format for the crop classifier.
+#
+# A directory of uncompressed .npy files plus a manifest.json. Every array is
+# opened with np.load(mmap_mode='r'), so startup does no unpickling and every
+# worker on a host maps the same page-cache pages instead of holding a private
+# copy. Only NumPy is needed to load it; sklearn is never imported.
+FORMAT_VERSION = 1
+SCALER_ARRAYS = ("scale", "min")
+
+
+# MinMaxScaler.transform without the estimator: same float64 operations in the
+# same order (X *= scale_; X += min_; optional clip), so results are identical
+class MinMaxTransform:
+    def __init__(self, scale, min_, feature_range=(0, 1), clip=False):
+        self.scale = scale
+        self.min = min_
+        self.feature_range = tuple(feature_range)
+        self.clip = clip
+
+    @classmethod
+    def from_scaler(cls, scaler):
+        return cls(scaler.scale_, scaler.min_, scaler.feature_range, getattr(scaler, "clip", False))
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(self.scale):
+            raise ValueError(f"Expected {len(self.scale)} features, got shape {X.shape}")
+        X *= self.scale
+        X += self.min
+        if self.clip:
+            np.clip(X, self.feature_range[0], self.feature_range[1], out=X)
+        return X
+
+
+# Size and mtime of the source pickles, recorded to detect stale artifacts
+def source_stamp(paths):
+    stamp = {}
+    for path in paths:
+        stat = os.stat(path)
+        stamp[os.path.basename(path)] = [stat.st_size, stat.st_mtime_ns]
+    return stamp
+
+
+def export_artifacts(scaler, model, out_dir, sources=()):
+    transform = MinMaxTransform.from_scaler(scaler)
+    forest = CompiledForest.from_estimator(model)
+
+    staging = atomic_dir.staging(out_dir)
+    try:
+        for name in SCALER_ARRAYS:
+            np.save(os.path.join(staging, f"scaler_{name}.npy"),
+                    np.ascontiguousarray(getattr(transform, name)))
+        for name in CompiledForest.ARRAYS:
+            np.save(os.path.join(staging, f"forest_{name}.npy"),
+                    np.ascontiguousarray(getattr(forest, name)))
+        with open(os.path.join(staging, "manifest.json"), "w") as f:
+            json.dump({
+                'format': FORMAT_VERSION,
+                'scaler': {'feature_range': list(transform.feature_range), 'clip': bool(transform.clip)},
+                'forest': {'max_depth': forest.max_depth},
+                'sources': source_stamp(sources),
+            }, f, indent=2)
+        # Swap the finished directory in; readers never see a missing or
+        # partial artifact, and workers exporting at once do not collide
+        atomic_dir.publish(staging, out_dir)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+# (manifest, is_current) for an artifact directory, or (None, False) if absent
+def read_manifest(out_dir, sources=()):
+    try:
+        with open(os.path.join(out_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None, False
+    try:
+        current = (manifest.get('format') == FORMAT_VERSION
+                   and manifest.get('sources') == source_stamp(sources))
+    except OSError:
+        current = True  # Sources removed: the artifact is all we have
+    return manifest, current
+
+
+def load_artifacts(out_dir, manifest=None):
+    out_dir = atomic_dir.resolve(out_dir)  # Every file from one version
+    if manifest is None:
+        with open(os.path.join(out_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+
+    def mapped(name):
+        return np.asarray(np.load(os.path.join(out_dir, f"{name}.npy"), mmap_mode='r'))
+
+    transform = MinMaxTransform(mapped("scaler_scale"), mapped("scaler_min"),
+                                manifest['scaler']['feature_range'], manifest['scaler']['clip'])
+    forest = CompiledForest(*(mapped(f"forest_{name}") for name in CompiledForest.ARRAYS),
+                            max_depth=manifest['forest']['max_depth'])
+    return transform, forest
+
+
+# Build step: python fast_artifacts.py [scaler.pkl model.pkl out_dir]
+if __name__ == '__main__':
+    import pickle
+    scaler_path, model_path, out_dir = (sys.argv[1:4] if len(sys.argv) == 4 else
+                                        ("ml_components/minmaxscaler.pkl",
+                                         "ml_components/model.pkl",
+                                         "ml_components/fast"))
+    with open(scaler_path, "rb") as f:
+        scaler = pickle.load(f)
+    with open(model_path, "rb") as f:
+        model = pickle.load(f)
+    export_artifacts(scaler, model, out_dir, sources=(scaler_path, model_path))
+    print(f"Wrote fast-start artifacts to {out_dir}")
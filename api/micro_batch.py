@@ -0,0 +1,69 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+# Coalesces concurrent single-row predictions into one vectorized call.
+# Callers submit one feature row and wait on a Future; a worker thread collects
+# rows for up to `window` seconds or `max_batch` rows, runs predict_fn once on
+# the stacked batch, and fans the results back out in submission order.
+class MicroBatcher:
+    def __init__(self, predict_fn, window=0.002, max_batch=64):
+        self.predict_fn = predict_fn
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.rows = 0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, row):
+        future = Future()
+        self._queue.put((row, future))
+        return future
+
+    def predict(self, row, timeout=None):
+        return self.submit(row).result(timeout=timeout)
+
+    def _collect(self):
+        pending = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(pending) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                pending.append(self._queue.get(timeout=remaining) if remaining > 0
+                               else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            try:
+                results = self.predict_fn(np.vstack([row for row, _ in pending]))
+            except Exception:
+                # One bad row must not fail its neighbours: retry row by row
+                for row, future in pending:
+                    try:
+                        future.set_result(self.predict_fn(np.atleast_2d(row))[0])
+                    except Exception as e:
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.rows += len(pending)
+            for (_, future), result in zip(pending, results):
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            'window_ms': self.window * 1000,
+            'max_batch': self.max_batch,
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch_size': round(self.rows / self.batches, 2) if self.batches else 0.0,
+        }
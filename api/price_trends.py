@@ -0,0 +1,73 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Season columns of crop_prices.csv, e.g. "2019-20"
+YEAR_COLUMN = re.compile(r'^\d{4}-\d{2}$')
+
+
+# crop_prices.csv with column names and text cells stripped (vectorized)
+def load_prices(path):
+    df = pd.read_csv(path)
+    df.columns = df.columns.str.strip()
+    for column in df.columns:
+        if pd.api.types.is_string_dtype(df[column]):
+            df[column] = df[column].str.strip()
+    return df
+
+
+# Least-squares linear trend of every (Crop, State) price series, fitted at once.
+# Seasons are x = 0..n-1; with `observed` masking missing prices, the normal
+# equations reduce to a few row sums, so one matrix product per sum fits all
+# series. Series with fewer than two prices get no fit. The first row of a
+# duplicated (crop, state) pair wins, as with the old per-request filter.
+class PriceTrends:
+    def __init__(self, df):
+        self.years = [column for column in df.columns if YEAR_COLUMN.match(column)]
+        df = df.drop_duplicates(['Crop', 'State'])
+        prices = df[self.years].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+        x = np.arange(len(self.years), dtype=float)
+        observed = ~np.isnan(prices)
+        y = np.where(observed, prices, 0.0)
+        sums = observed @ np.stack([np.ones_like(x), x, x * x], axis=1)  # n, sum x, sum x^2
+        n, sx, sxx = sums.T
+        sy, sxy = (y @ np.stack([np.ones_like(x), x], axis=1)).T
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+            intercept = (sy - slope * sx) / n
+        fitted = n >= 2
+
+        self.crops = df['Crop'].to_numpy()[fitted]
+        self.states = df['State'].to_numpy()[fitted]
+        self.prices = prices[fitted]
+        self.slope = slope[fitted]
+        self.intercept = intercept[fitted]
+        self.index = {(crop, state): i for i, (crop, state) in enumerate(zip(self.crops, self.states))}
+
+    # Trend line value `horizon` seasons after the last one, for every series
+    def predict(self, horizon=1):
+        return self.slope * (len(self.years) - 1 + horizon) + self.intercept
+
+    # (len(rows), horizon) matrix of the next `horizon` seasons of the series `rows`
+    def forecast(self, rows, horizon):
+        steps = len(self.years) + np.arange(horizon)
+        return self.slope[rows, None] * steps + self.intercept[rows, None]
+
+    # Labels of the next `horizon` seasons, continuing the "2022-23" pattern
+    def seasons(self, horizon):
+        first = int(self.years[-1][:4]) + 1
+        return [f"{year}-{(year + 1) % 100:02d}" for year in range(first, first + horizon)]
+
+    # Response body of one series, as served by /api/price/predict
+    def record(self, i, predicted):
+        return {
+            "crop": self.crops[i],
+            "state": self.states[i],
+            "predicted_price": round(float(predicted), 2),
+            "trend": "increasing" if self.slope[i] > 0 else "decreasing",
+            "historical_prices": {year: None if np.isnan(price) else float(price)
+                                  for year, price in zip(self.years, self.prices[i])},
+            "currency": "INR/quintal"
+        }
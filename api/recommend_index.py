@@ -0,0 +1,304 @@
+import itertools
+import json
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+
+# Positions of the k largest scores, score descending and position ascending on
+# ties, found with a partial selection instead of sorting every scored row.
+def top_k_indices(scores, k):
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k >= n:
+        return np.lexsort((np.arange(n), -scores))
+
+    kth = np.partition(scores, n - k)[n - k]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    best = np.r_[above, ties]
+    return best[np.lexsort((best, -scores[best]))]
+
+
+# Concatenated ranges lo[i]:hi[i], without a Python loop
+def spans(lo, hi):
+    lengths = hi - lo
+    total = int(lengths.sum())
+    return np.repeat(lo - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+
+
+# Inverted-file (IVF) index over the TF-IDF rows, for approximate top-k on
+# large catalogs. Rows are clustered by k-means on TruncatedSVD-reduced dense
+# vectors into n_lists lists, and the stored weights are kept as postings
+# grouped by (term, list), each group with its largest weight. Summed over the
+# query terms, those maxima bound the score of any row in a list. A query
+# opens lists in descending bound order and scores their rows exactly from the
+# postings of its own terms; it stops once no unopened list can beat the k-th
+# score found (the result is then exact) or after `nprobe` lists, the recall
+# vs latency knob.
+class IVFIndex:
+    def __init__(self, matrix, n_components=64, n_lists=None, nprobe=32, exact_below=50000,
+                 train_rows=100000, seed=0):
+        rng = np.random.default_rng(seed)
+        n_rows, n_terms = matrix.shape
+        self.nprobe = nprobe
+        self.exact_below = exact_below
+        self.n_lists = n_lists = max(1, min(n_lists or 4 * int(np.sqrt(n_rows)), n_rows))
+
+        # Projection and centroids are fitted on a sample; every row is then assigned
+        sample = np.sort(rng.choice(n_rows, min(train_rows, n_rows), replace=False))
+        svd = TruncatedSVD(n_components=max(1, min(n_components, n_terms - 1)), random_state=seed)
+        components = svd.fit(matrix[sample]).components_.T.astype(np.float32)
+        reduce = lambda rows: normalize(np.asarray(rows @ components))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, init="random", n_init=1, random_state=seed)
+        centroids = normalize(kmeans.fit(reduce(matrix[sample])).cluster_centers_).astype(np.float32)
+        lists = np.empty(n_rows, dtype=np.int64)
+        chunk_size = max(1, 2 ** 24 // n_lists)  # (rows x lists) similarity block of ~64 MB
+        for lo in range(0, n_rows, chunk_size):
+            lists[lo:lo + chunk_size] = np.argmax(reduce(matrix[lo:lo + chunk_size]) @ centroids.T, axis=1)
+
+        # Postings sorted by (term, list, row); `pairs` holds each group's key
+        matrix = matrix.tocsr()
+        rows = np.repeat(np.arange(n_rows, dtype=np.int32), np.diff(matrix.indptr))
+        keys = matrix.indices.astype(np.int64) * n_lists + lists[rows]
+        order = np.lexsort((rows, keys))
+        keys, self.posting_rows, self.posting_weights = keys[order], rows[order], matrix.data[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.intp)
+        self.pairs = keys[starts]
+        self.pair_starts = np.r_[starts, len(keys)]
+        self.pair_max = np.maximum.reduceat(self.posting_weights, starts) if len(keys) else np.empty(0)
+        self.term_starts = np.searchsorted(self.pairs, np.arange(n_terms + 1, dtype=np.int64) * n_lists)
+
+    # Top-k (rows, scores) among rows start:stop with a positive score, opening
+    # at most `nprobe` lists; may return fewer than top_k rows
+    def search(self, query_vec, start, stop, top_k, nprobe=None):
+        nprobe = self.nprobe if nprobe is None else nprobe
+        terms, weights = query_vec.indices.astype(np.int64), query_vec.data
+        # Upper bound per list: sum over the query terms of weight x group maximum
+        lo, hi = self.term_starts[terms], self.term_starts[terms + 1]
+        groups = spans(lo, hi)
+        bound = np.bincount(self.pairs[groups] % self.n_lists, minlength=self.n_lists,
+                            weights=self.pair_max[groups] * np.repeat(weights, hi - lo))
+        candidates = np.flatnonzero(bound > 0)
+        ranked = candidates[np.argsort(-bound[candidates], kind="stable")][:nprobe]
+
+        rows, scores = np.empty(0, dtype=np.int32), np.empty(0)
+        opened, batch = 0, 1
+        while opened < len(ranked):
+            lists = ranked[opened:opened + batch]
+            opened, batch = opened + len(lists), batch * 2
+            # Exact scores of the opened lists' rows from the query terms' postings
+            wanted = (terms[:, None] * self.n_lists + lists).ravel()
+            found = np.minimum(np.searchsorted(self.pairs, wanted), len(self.pairs) - 1)
+            hit = self.pairs[found] == wanted
+            found = found[hit]
+            lengths = self.pair_starts[found + 1] - self.pair_starts[found]
+            entries = spans(self.pair_starts[found], self.pair_starts[found + 1])
+            term_weights = np.repeat(np.repeat(weights, len(lists))[hit], lengths)
+            matched, inverse = np.unique(self.posting_rows[entries], return_inverse=True)
+            matched_scores = np.bincount(inverse, weights=self.posting_weights[entries] * term_weights)
+            keep = (matched >= start) & (matched < stop)
+            rows = np.concatenate([rows, matched[keep]])
+            scores = np.concatenate([scores, matched_scores[keep]])
+            best = top_k_indices(scores, top_k)
+            rows, scores = rows[best], scores[best]
+            # Stop once the remaining lists cannot beat the k-th score
+            if len(rows) == top_k and opened < len(ranked) and bound[ranked[opened]] < scores[-1]:
+                break
+        return rows.astype(np.intp), scores
+
+
+# Precomputed TF-IDF index over the hybrid catalog.
+# Rows are grouped by crop so every crop filter is a contiguous row range
+# (start, stop) of one L2-normalized sparse matrix, and a query is a single
+# sparse dot product over the rows it needs.
+class RecommendationIndex:
+    _versions = itertools.count(1)
+
+    # Field projections selectable per request; None means every column
+    PROJECTIONS = {
+        'full': None,
+        'card': ["Crop", "Hybrid", "Benefit1", "Benefit2", "Benefit3", "Region", "Duration",
+                 "Yield", "DiseaseResistance", "SpecialFeatures", "Vendors"],
+        'compare': ["Crop", "Hybrid", "Benefit1", "Benefit2", "Region", "Duration", "Yield"],
+    }
+
+    def __init__(self, df, vectorizer, tfidf_matrix, ann=None):
+        # Distinct per built index, so cached results never outlive their catalog
+        self.version = next(self._versions)
+        order = np.argsort(df["Crop"].to_numpy(dtype=str), kind="stable")
+
+        self.vectorizer = vectorizer
+        self.frame = df.iloc[order].reset_index(drop=True)
+        # Catalog position of every row, to list filter results in catalog order
+        self.positions = order
+        self.matrix = normalize(tfidf_matrix[order], norm="l2").tocsr()
+        # Term-major copy so a block of queries is one CSR x CSR product
+        self.matrix_t = self.matrix.T.tocsr()
+        self.slices = self._crop_slices(self.frame["Crop"].to_numpy(dtype=str))
+        # Optional approximate index, built from keyword arguments for IVFIndex
+        self.ann = IVFIndex(self.matrix, **ann) if ann is not None else None
+
+        # Lookups for /api/compare: crop -> rows is the slice above, plus
+        # hybrid name -> rows and lowercased region value -> rows
+        self.hybrid_rows = self._group_rows(self.frame["Hybrid"].astype(str))
+        self.region_rows = self._group_rows(self.frame["Region"].astype(str).str.lower())
+        self._region_matches = {}
+
+        # Pre-encoded JSON per row and projection; 'full' is built eagerly
+        self._encoded = {}
+        self.encoded_rows('full')
+
+    @staticmethod
+    def _crop_slices(crops):
+        slices = {}
+        if len(crops) == 0:
+            return slices
+        starts = np.flatnonzero(np.r_[True, crops[1:] != crops[:-1]])
+        stops = np.r_[starts[1:], len(crops)]
+        for start, stop in zip(starts, stops):
+            slices[crops[start]] = (int(start), int(stop))
+        return slices
+
+    @staticmethod
+    def _group_rows(values):
+        return {key: rows.astype(np.intp) for key, rows in values.groupby(values.to_numpy()).indices.items()}
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    # Row range covered by a crop filter ("All" is the whole catalog)
+    def rows_for(self, selected_crop):
+        if selected_crop == "All":
+            return 0, len(self)
+        return self.slices.get(selected_crop, (0, 0))
+
+    # Rows whose region contains selected_region (case-insensitive substring).
+    # Matching runs over the distinct region values once per query string, then
+    # the result is memoized.
+    def rows_in_region(self, selected_region):
+        needle = selected_region.lower()
+        rows = self._region_matches.get(needle)
+        if rows is None:
+            matched = [value_rows for value, value_rows in self.region_rows.items() if needle in value]
+            rows = np.sort(np.concatenate(matched)) if matched else np.empty(0, dtype=np.intp)
+            if len(self._region_matches) >= 4096:
+                self._region_matches.clear()
+            self._region_matches[needle] = rows
+        return rows
+
+    # Row ids matching the /api/compare filters, built from the lookups with
+    # set intersections instead of scanning the frame, in catalog order
+    def filter_rows(self, selected_crop="All", selected_region="All", hybrids=None):
+        start, stop = self.rows_for(selected_crop)
+        if hybrids:
+            found = [self.hybrid_rows[h] for h in set(map(str, hybrids)) if h in self.hybrid_rows]
+            rows = np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.intp)
+            rows = rows[(rows >= start) & (rows < stop)]
+        else:
+            rows = np.arange(start, stop)
+        if selected_region != "All":
+            rows = np.intersect1d(rows, self.rows_in_region(selected_region), assume_unique=True)
+        return rows[np.argsort(self.positions[rows], kind="stable")]
+
+    # Cosine similarity of the query against the rows start:stop
+    def score(self, query_vec, start, stop):
+        rows = self.matrix if (start, stop) == (0, len(self)) else self.matrix[start:stop]
+        return (rows @ query_vec.T).toarray().ravel()
+
+    # Top-k (rows, scores) of one crop slice. With approximate=True and an ANN
+    # index, slices of at least exact_below rows search the IVF lists instead
+    # of scoring every row; smaller slices and empty queries are scored exactly.
+    def top_rows(self, user_input, selected_crop, top_k=5, approximate=False, nprobe=None):
+        start, stop = self.rows_for(selected_crop)
+        query_vec = self.vectorizer.transform([user_input])
+
+        if approximate and self.ann is not None and query_vec.nnz and stop - start >= self.ann.exact_below:
+            rows, scores = self.ann.search(query_vec, start, stop, top_k, nprobe)
+            return self._fill(rows, scores, start, stop, top_k)
+
+        scores = self.score(query_vec, start, stop)
+        best = top_k_indices(scores, top_k)
+        return start + best, scores[best]
+
+    # Fewer matches than top_k: fill with zero-score rows in slice order, as
+    # the exact scan ranks them
+    @staticmethod
+    def _fill(rows, scores, start, stop, top_k):
+        missing = min(top_k, stop - start) - len(rows)
+        if missing > 0:
+            filler = np.setdiff1d(np.arange(start, min(stop, start + top_k + len(rows))), rows)
+            rows = np.r_[rows, filler[:missing]]
+            scores = np.r_[scores, np.zeros(missing)]
+        return rows, scores
+
+    # recall@k of the approximate search against the exact scan over `queries`
+    # (user inputs), counting a row as found when it scores at least the k-th
+    # exact score; for tuning nprobe on a given catalog
+    def ann_recall(self, queries, top_k=5, nprobe=None):
+        found = expected = 0
+        for user_input in queries:
+            query_vec = self.vectorizer.transform([user_input])
+            exact = self.score(query_vec, 0, len(self))
+            exact = exact[top_k_indices(exact, top_k)]
+            exact = exact[exact > 0]
+            if not len(exact):
+                continue
+            _, scores = self.ann.search(query_vec, 0, len(self), top_k, nprobe)
+            found += int((scores[:len(exact)] >= exact[-1] - 1e-9).sum())
+            expected += len(exact)
+        return found / expected if expected else 1.0
+
+    # Score many (user_input, selected_crop) queries with one vectorizer call and
+    # one sparse query x catalog product, then pick each query's top-k inside its
+    # crop slice. Ordering matches top_rows(): score descending, row order on ties.
+    def top_rows_batch(self, queries, top_k=5):
+        query_matrix = self.vectorizer.transform([user_input for user_input, _ in queries])
+        scores = (query_matrix @ self.matrix_t).tocsr()
+        scores.sort_indices()
+
+        results = []
+        for i, (_, selected_crop) in enumerate(queries):
+            start, stop = self.rows_for(selected_crop)
+            lo, hi = scores.indptr[i], scores.indptr[i + 1]
+            rows, values = scores.indices[lo:hi], scores.data[lo:hi]
+
+            keep = (rows >= start) & (rows < stop) & (values > 0)
+            rows, values = rows[keep], values[keep]
+            best = top_k_indices(values, top_k)
+            results.append(self._fill(rows[best], values[best], start, stop, top_k))
+        return results
+
+    def recommend(self, user_input, selected_crop, top_k=5, approximate=False, nprobe=None):
+        rows, scores = self.top_rows(user_input, selected_crop, top_k, approximate, nprobe)
+        return self.frame.iloc[rows].assign(Match_Score=scores)
+
+    def recommend_batch(self, queries, top_k=5):
+        return [self.frame.iloc[rows].assign(Match_Score=scores)
+                for rows, scores in self.top_rows_batch(queries, top_k)]
+
+    # Every row of the frame encoded once as a JSON object body without its
+    # closing brace, so per-request fields such as Match_Score can be appended
+    def encoded_rows(self, fields='full'):
+        encoded = self._encoded.get(fields)
+        if encoded is None:
+            columns = self.PROJECTIONS[fields] or list(self.frame.columns)
+            encoded = [
+                json.dumps(record, sort_keys=True, separators=(",", ":"))[:-1].encode()
+                for record in self.frame[columns].to_dict(orient='records')
+            ]
+            self._encoded[fields] = encoded
+        return encoded
+
+    # JSON array of the given rows assembled from the pre-encoded bytes
+    def records_json(self, rows, scores=None, fields='full'):
+        encoded = self.encoded_rows(fields)
+        if scores is None:
+            parts = [encoded[row] + b"}" for row in rows]
+        else:
+            parts = [encoded[row] + b',"Match_Score":' + repr(float(score)).encode() + b"}"
+                     for row, score in zip(rows, scores)]
+        return b"[" + b",".join(parts) + b"]"
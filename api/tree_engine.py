@@ -0,0 +1,120 @@
+import sys
+
+import numpy as np
+
+
+# Flattened tree-ensemble inference engine.
+# Every tree of a fitted RandomForestClassifier (or a single decision tree) is
+# packed into contiguous node arrays; prediction walks all samples through all
+# trees at once with NumPy fancy indexing instead of sklearn's per-estimator
+# dispatch. Results match the estimator exactly: inputs are compared as float32
+# like sklearn does, and per-tree probabilities are accumulated in tree order.
+class CompiledForest:
+    ARRAYS = ("feature", "threshold", "left", "right", "missing_left", "values", "roots", "classes")
+
+    def __init__(self, feature, threshold, left, right, missing_left, values, roots, classes,
+                 max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.values = values
+        self.roots = roots
+        self.classes = classes
+        self.max_depth = int(max_depth)
+        self.is_leaf = left == np.arange(len(left))
+
+    @classmethod
+    def from_estimator(cls, model):
+        from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+        from sklearn.tree import DecisionTreeClassifier, ExtraTreeClassifier
+
+        supported = (RandomForestClassifier, ExtraTreesClassifier, DecisionTreeClassifier,
+                     ExtraTreeClassifier)
+        if not isinstance(model, supported) or model.n_outputs_ != 1:
+            raise TypeError(f"Cannot compile {type(model).__name__}: expected a single-output "
+                            "random forest or decision tree classifier")
+        estimators = getattr(model, "estimators_", [model])
+        trees = [estimator.tree_ for estimator in estimators]
+        roots = np.cumsum([0] + [tree.node_count for tree in trees[:-1]]).astype(np.int32)
+
+        feature, threshold, left, right, missing_left, values = [], [], [], [], [], []
+        for root, tree in zip(roots, trees):
+            leaf = tree.children_left == -1
+            nodes = np.arange(tree.node_count, dtype=np.int32) + root
+            # Leaves point at themselves so a fixed number of steps settles every path
+            left.append(np.where(leaf, nodes, tree.children_left + root).astype(np.int32))
+            right.append(np.where(leaf, nodes, tree.children_right + root).astype(np.int32))
+            feature.append(np.where(leaf, 0, tree.feature).astype(np.int32))
+            threshold.append(np.where(leaf, 0.0, tree.threshold))
+            missing = getattr(tree, "missing_go_to_left", None)
+            missing_left.append(np.zeros(tree.node_count, dtype=bool) if missing is None
+                                else np.asarray(missing, dtype=bool))
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :]
+            normalizer = value.sum(axis=1)
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value / normalizer[:, None])
+
+        classes = np.asarray(model.classes_)
+        if classes.dtype == object:
+            classes = classes.astype(str)
+        return cls(np.concatenate(feature), np.concatenate(threshold), np.concatenate(left),
+                   np.concatenate(right), np.concatenate(missing_left), np.concatenate(values),
+                   roots, classes, max(tree.max_depth for tree in trees))
+
+    def save(self, path):
+        np.savez(path, max_depth=self.max_depth,
+                 **{name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(*(arrays[name] for name in cls.ARRAYS), max_depth=arrays["max_depth"])
+
+    # Leaf node reached by every (sample, tree) pair. Pairs are walked on flat
+    # arrays and dropped from the working set as soon as they reach a leaf.
+    def apply(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        flat_x = X.ravel()
+        has_nan = np.isnan(flat_x).any()
+        nodes = np.tile(self.roots, len(X))
+        offsets = np.repeat(np.arange(len(X)) * X.shape[1], len(self.roots))
+        active = np.arange(len(nodes))
+
+        for _ in range(self.max_depth):
+            current = nodes[active]
+            inner = ~self.is_leaf[current]
+            active, current = active[inner], current[inner]
+            if len(active) == 0:
+                break
+            x = flat_x[offsets[active] + self.feature[current]]
+            go_left = x <= self.threshold[current]
+            if has_nan:
+                go_left |= np.isnan(x) & self.missing_left[current]
+            nodes[active] = np.where(go_left, self.left[current], self.right[current])
+        return nodes.reshape(len(X), len(self.roots))
+
+    def predict_proba(self, X, chunk_size=512):
+        X = np.asarray(X, dtype=np.float32)
+        proba = np.empty((len(X), self.values.shape[1]))
+        for lo in range(0, len(X), chunk_size):
+            leaves = self.apply(X[lo:lo + chunk_size])
+            # cumsum adds trees strictly in order, like RandomForest's accumulation
+            proba[lo:lo + len(leaves)] = np.cumsum(self.values[leaves], axis=1)[:, -1]
+        return proba / len(self.roots)
+
+    def predict(self, X):
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1))
+
+
+# Export step: python tree_engine.py <model.pkl|model.joblib> <output.npz>
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("usage: python tree_engine.py <model.pkl|model.joblib> <output.npz>")
+    import joblib
+    model = joblib.load(sys.argv[1])
+    forest = CompiledForest.from_estimator(model)
+    forest.save(sys.argv[2])
+    print(f"Exported {len(forest.roots)} trees, {len(forest.feature)} nodes to {sys.argv[2]}")
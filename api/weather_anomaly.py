@@ -3,11 +3,31 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import pandas as pd
 from datetime import datetime
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
 import uvicorn
 from fastapi.responses import HTMLResponse
 
+from climatology import Climatology
+from weather_index import WeatherIndex, city_key
+from weather_ingest import IngestLog, prepare
+from weather_store import load_weather
+
 app = FastAPI(title="AgriSetu Weather Anomaly API")
 
+# Request handlers only enqueue log records; a listener thread does the writing
+log_queue = queue.SimpleQueue()
+logger = logging.getLogger("weather_anomaly")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+logger.addHandler(logging.handlers.QueueHandler(log_queue))
+log_listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+log_listener.start()
+atexit.register(log_listener.stop)
+
 # Enable CORS for all routes
 app.add_middleware(
     CORSMiddleware,
@@ -17,18 +37,81 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load or simulate the weather dataset
+# Load the weather dataset from its columnar cache (rebuilt when the CSV changes);
+# dates are parsed day-first and rows with invalid dates are dropped at build time
 def load_data():
-    df = pd.read_csv("weather_data.csv")
-    # Explicitly specify date format and handle errors
-    df['date_time'] = pd.to_datetime(df['date_time'], format='%d-%m-%Y %H:%M', errors='coerce')
-    # Drop rows with invalid dates
-    df = df.dropna(subset=['date_time'])
-    df['month'] = df['date_time'].dt.month
-    df['day'] = df['date_time'].dt.date
-    return df
+    return load_weather("weather_data.csv")
+
+# Rows partitioned by (city, month) so a request is a dict lookup plus a slice
+index = WeatherIndex(load_data())
+df = index.frame
+
+# Per-(city, month, hour) climatology; anomalies are readings far from normal
+climate = Climatology(index)
+CLIMATE_Z = float(os.environ.get("CLIMATE_Z", "2.0"))
+CLIMATE_METHODS = ('zscore', 'percentile')
+
+# Most recent reading of every (city, month) partition scored against the
+# climatology, plus its 7-day baseline forecast. Computed once at load so
+# /detect-anomalies does no data work on the event loop.
+SUMMARY_COLUMNS = ('maxtempC', 'precipMM')
+
+def summarize(climate, city, month, rows, latest, values):
+    summary = {'rows': rows, 'time': latest, 'forecast': climate.daily_baseline(city, month, latest.date())}
+    for column, value in values.items():
+        summary[column] = value
+        summary[f"{column}Score"] = climate.score(city, month, latest.hour, column, value)
+    return summary
+
+def partition_summaries(index, climate, columns=SUMMARY_COLUMNS):
+    values = index.frame[list(columns)].to_numpy(dtype=float)
+    stamps = index.frame['date_time'].to_numpy()
+    return {
+        (city, month): summarize(climate, city, month, stop - start, pd.Timestamp(stamps[stop - 1]),
+                                 dict(zip(columns, values[stop - 1].tolist())))
+        for (city, month), (start, stop) in index.partitions.items()
+    }
+
+latest_by_partition = partition_summaries(index, climate)
 
-df = load_data()
+# Fold a batch of new observations into the climatology and re-summarize only
+# the partitions it touches; the latest reading moves forward, never back.
+# Rows without a temperature or precipitation reading are rejected.
+def apply_observations(frame):
+    frame = prepare(frame, climate.columns, SUMMARY_COLUMNS)
+    if frame.empty:
+        return 0
+    climate.update(frame)
+    counts = frame.groupby(['city_key', 'month']).size()
+    newest = frame.sort_values('date_time', kind='stable').drop_duplicates(['city_key', 'month'], keep='last')
+    for record in newest.to_dict('records'):
+        city, month = record['city_key'], int(record['month'])
+        current = latest_by_partition.get((city, month))
+        latest = pd.Timestamp(record['date_time'])
+        values = {column: float(record[column]) for column in SUMMARY_COLUMNS}
+        if current is not None and current['time'] > latest:
+            latest, values = current['time'], {column: current[column] for column in SUMMARY_COLUMNS}
+        rows = int(counts[(city, month)]) + (current['rows'] if current else 0)
+        latest_by_partition[(city, month)] = summarize(climate, city, month, rows, latest, values)
+    logger.info("Ingested %d observations into %d partitions", len(frame), len(newest))
+    return len(frame)
+
+# Replay the ingest log, then follow files dropped into it
+ingest_log = IngestLog()
+ingest_log.poll(apply_observations)
+ingest_log.watch(apply_observations)
+
+# Anomaly text for a scored reading: |z| beyond CLIMATE_Z, or outside the
+# 5th-95th percentile band of its (city, month, hour)
+def climate_anomaly(score, method, high_label, low_label=""):
+    if score is None:
+        return ""
+    if method == 'percentile':
+        high, low = score['abovePercentile'], score['belowPercentile']
+    else:
+        z = score['zScore']
+        high, low = z is not None and z > CLIMATE_Z, z is not None and z < -CLIMATE_Z
+    return high_label if high else low_label if low else ""
 
 # Request schema
 class WeatherRequest(BaseModel):
@@ -36,6 +119,10 @@ class WeatherRequest(BaseModel):
     month: int
     season: str
     cropType: str
+    method: str = "zscore"
+
+class IngestRequest(BaseModel):
+    observations: list[dict]
 
 # Root route for status check
 @app.get("/", response_class=HTMLResponse)
@@ -51,22 +138,21 @@ def home():
     </html>
     """
 
-# Function to simulate the prediction based on past data
-def predict_weather(df, city, month):
-    filtered = df[(df['city'].str.lower() == city.lower()) & (df['month'] == month)]
+# Average conditions of a (city, month) with the climatological 7-day baseline
+def predict_weather(index, city, month):
+    filtered = index.partition(city, month)
 
     if filtered.empty:
         raise Exception(f"No weather data available for {city} during month {month}.")
 
-    # Example: Calculate the average of the past data
     avg_temp = filtered['maxtempC'].mean()
     avg_precip = filtered['precipMM'].mean()
     avg_humidity = filtered['humidity'].mean()
 
-    # Generate a simulated 7-day forecast (for simplicity, here it's just average data)
+    baseline = latest_by_partition[(city_key(city), month)]['forecast']
     forecast = {
-        "temperature": {"current": avg_temp, "predicted": [avg_temp]*7},
-        "precipitation": {"current": avg_precip, "predicted": [avg_precip]*7},
+        "temperature": {"current": avg_temp, "predicted": [day['maxtempC'] for day in baseline]},
+        "precipitation": {"current": avg_precip, "predicted": [day['precipMM'] for day in baseline]},
     }
 
     return forecast
@@ -93,59 +179,85 @@ def generate_crop_advice(weather_forecast, crop_type):
 
     return advice
 
-# Anomaly detection and weather forecasting endpoint
-@app.post("/detect-anomalies")
-async def detect_anomalies(request: WeatherRequest):
-    try:
-        print(f"Received request for city: {request.city}, month: {request.month}")
-        
-        filtered = df[(df['city'].str.lower() == request.city.lower()) & 
-                     (df['month'] == request.month)]
-        
-        print(f"Found {len(filtered)} matching records")
-        
-        if filtered.empty:
-            print("No matching data found")
-            return {
-                "status": "error",
-                "message": f"No data found for {request.city.title()} in month {request.month}.",
-                "prediction": None
-            }
+# Anomaly detection and weather forecast for one request: a dict lookup and a
+# few comparisons, cheap enough to run directly on the event loop
+def build_prediction(request):
+    logger.info("Received request for city: %s, month: %s", request.city, request.month)
 
-        # Get the most recent data point
-        latest = filtered.iloc[-1]
-        
-        # Generate predictions
-        prediction = {
-            "weatherForecast": {
-                "temperature": {
-                    "current": latest['maxtempC'],
-                    "predicted": [latest['maxtempC']] * 7,  # Simplified prediction
-                    "anomaly": "High temperature warning" if latest['maxtempC'] > 35 else ""
-                },
-                "precipitation": {
-                    "current": latest['precipMM'],
-                    "predicted": [latest['precipMM']] * 7,  # Simplified prediction
-                    "anomaly": "Heavy rain expected" if latest['precipMM'] > 15 else ""
-                }
-            },
-            "riskAssessment": "Moderate risk based on current conditions",
-            "cropRecommendations": generate_crop_advice({
-                "temperature": {"current": latest['maxtempC']},
-                "precipitation": {"current": latest['precipMM']}
-            }, request.cropType)
-        }
+    latest = latest_by_partition.get((city_key(request.city), request.month))
+
+    logger.info("Found %d matching records", latest['rows'] if latest else 0)
 
+    if latest is None:
+        logger.info("No matching data found")
         return {
-    "status": "success",
-    "message": f"Weather prediction for {request.city.title()}",
-    "prediction": prediction  # Fixed typo here (was "prediction")
-}
+            "status": "error",
+            "message": f"No data found for {request.city.title()} in month {request.month}.",
+            "prediction": None
+        }
+
+    if request.method not in CLIMATE_METHODS:
+        raise ValueError(f"Unknown method '{request.method}', expected one of: {', '.join(CLIMATE_METHODS)}")
+
+    temp_score, precip_score = latest['maxtempCScore'], latest['precipMMScore']
+    temp_anomaly = climate_anomaly(temp_score, request.method,
+                                   "Unusually high temperature for this time of year",
+                                   "Unusually low temperature for this time of year")
+    precip_anomaly = climate_anomaly(precip_score, request.method,
+                                     "Unusually heavy rain for this time of year")
+    flagged = bool(temp_anomaly) + bool(precip_anomaly)
+
+    # Current reading against climatology, plus the 7-day baseline forecast
+    prediction = {
+        "weatherForecast": {
+            "dates": [day['date'] for day in latest['forecast']],
+            "temperature": {
+                "current": latest['maxtempC'],
+                "predicted": [day['maxtempC'] for day in latest['forecast']],
+                "normal": temp_score and temp_score['normal'],
+                "zScore": temp_score and temp_score['zScore'],
+                "anomaly": temp_anomaly
+            },
+            "precipitation": {
+                "current": latest['precipMM'],
+                "predicted": [day['precipMM'] for day in latest['forecast']],
+                "normal": precip_score and precip_score['normal'],
+                "zScore": precip_score and precip_score['zScore'],
+                "anomaly": precip_anomaly
+            }
+        },
+        "riskAssessment": (f"High risk: {flagged} reading(s) far outside the normal range" if flagged
+                           else "Low risk: conditions are within the normal range for this time of year"),
+        "cropRecommendations": generate_crop_advice({
+            "temperature": {"current": latest['maxtempC']},
+            "precipitation": {"current": latest['precipMM']}
+        }, request.cropType)
+    }
 
+    return {
+        "status": "success",
+        "message": f"Weather prediction for {request.city.title()}",
+        "prediction": prediction
+    }
+
+# Anomaly detection and weather forecasting endpoint
+@app.post("/detect-anomalies")
+async def detect_anomalies(request: WeatherRequest):
+    try:
+        return build_prediction(request)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+# Append hourly observations; a sync handler, so the update runs off the event loop
+@app.post("/ingest")
+def ingest_observations(request: IngestRequest):
+    try:
+        rows = ingest_log.submit(pd.DataFrame(request.observations), apply_observations)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"ingested": rows, "rejected": len(request.observations) - rows}
+
 # Run the server
 if __name__ == '__main__':
     uvicorn.run("weather_anomaly:app", host="127.0.0.1", port=8004, reload=True)
@@ -1,24 +1,118 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+import io
+import json
+import os
+import threading
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
+from anomaly_rules import AnomalyTable, RuleEngine, versions
+from weather_index import WeatherIndex, city_key
+from weather_ingest import AppendedColumns, IngestLog, prepare
+from weather_store import load_weather
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Load weather data
+# Load weather data from the columnar cache of weather_data.csv
 def load_data():
-    df = pd.read_csv("weather_data.csv")  # replace with your actual file
-    df['date_time'] = pd.to_datetime(df['date_time'])
-    df['month'] = df['date_time'].dt.month
-    df['day'] = df['date_time'].dt.date
-    return df
+    return load_weather("weather_data.csv")
 
 df = load_data()
 
+# (city, month) partitions plus plain column arrays for the rule engine
+index = WeatherIndex(df)
+columns = {name: index.frame[name].to_numpy() for name in index.frame.columns
+           if pd.api.types.is_numeric_dtype(index.frame[name])}
+days = index.frame['day'].to_numpy()
+RECORD_COLUMNS = ['maxtempC', 'mintempC', 'humidity', 'uvIndex', 'precipMM']
+
+# Anomaly thresholds, overridable per crop/region in weather_rules.json
+rules = RuleEngine.from_file()
+rules.check_columns(columns)
+# Ingested rows need every column the rules or the records read
+INGEST_REQUIRED = sorted(set(RECORD_COLUMNS) | set(rules.columns()))
+
+# Anomalies materialized per rule set: the base rules at load, crop/region
+# overrides on first use. Requests only slice these tables.
+MAX_PAGE_SIZE = int(os.environ.get("WEATHER_MAX_PAGE", "5000"))
+STREAM_CHUNK_ROWS = 1000
+anomaly_tables = {}
+
+# Observations ingested after load, numbered on from the base rows; each batch
+# is evaluated against every materialized rule set as it arrives
+appended = AppendedColumns(len(days), {**{name: float for name in columns}, 'day': days.dtype,
+                                         'city_key': object})
+appended_keys = []  # (city_key, month) of every appended row
+ingested_cities = set()
+ingest_lock = threading.Lock()
+# Version of the multi-city query results; every ingested batch can reorder
+# them, so it is renewed per batch and older query cursors expire
+query_version = next(versions)
+
+def anomaly_table(ruleset):
+    table = anomaly_tables.get(ruleset)
+    if table is None:
+        with ingest_lock:
+            table = AnomalyTable(ruleset, columns, index.partitions)
+            table.extend(appended.view(), appended_keys, appended.offset)
+            table = anomaly_tables.setdefault(ruleset, table)
+    return table
+
+anomaly_table(rules.ruleset())
+
+def apply_observations(frame):
+    global query_version
+    frame = prepare(frame, list(columns), INGEST_REQUIRED)
+    if frame.empty:
+        return 0
+    keys = list(zip(frame['city_key'], frame['month'].tolist()))
+    batch = {name: frame[name].to_numpy(dtype=float) for name in columns}
+    with ingest_lock:
+        offset = appended.append(frame)
+        appended_keys.extend(keys)
+        for table in list(anomaly_tables.values()):
+            table.extend(batch, keys, offset)
+        ingested_cities.update(frame['city'])
+        query_version = next(versions)
+    return len(frame)
+
+# Replay the ingest log, then follow files dropped into it
+ingest_log = IngestLog()
+ingest_log.poll(apply_observations)
+ingest_log.watch(apply_observations)
+
+# Records for the anomalous rows `rows` with their anomaly labels
+def anomaly_records(rows, labels):
+    keys = ['day', *RECORD_COLUMNS, 'Anomalies']
+    values = [np.datetime_as_string(appended.take('day', days, rows), unit='D').tolist(),
+              *(appended.take(column, columns[column], rows).tolist() for column in RECORD_COLUMNS),
+              labels.tolist()]
+    return [dict(zip(keys, row)) for row in zip(*values)]
+
+def stream_records(ruleset, rows, masks):
+    for chunk in range(0, len(rows), STREAM_CHUNK_ROWS):
+        window = slice(chunk, chunk + STREAM_CHUNK_ROWS)
+        records = anomaly_records(rows[window], ruleset.label(masks[window]))
+        yield "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+# (version, offset) of a "<version>:<offset>" pagination cursor; (None, 0) when absent
+def parse_cursor(cursor):
+    if not cursor:
+        return None, 0
+    try:
+        version, offset = (int(part) for part in str(cursor).split(':'))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if offset < 0:
+        raise ValueError("Invalid cursor")
+    return version, offset
+
 @app.route('/api/weather/cities', methods=['GET'])
 def get_cities():
-    cities = sorted(df['city'].unique().tolist())
+    cities = sorted(set(df['city'].unique().tolist()) | ingested_cities)
     return jsonify(cities)
 
 @app.route('/api/weather/months', methods=['GET'])
@@ -40,42 +134,206 @@ def detect_anomalies():
     except ValueError:
         return jsonify({"error": "Month must be a number (1-12)"}), 400
     
-    # Filter data
-    filtered = df[(df['city'] == city) & (df['month'] == month)]
-    
-    # Define anomaly conditions
-    def detect_anomalies(row):
-        anomalies = []
-        if row['maxtempC'] > 45:
-            anomalies.append("🔥 Extreme Heat (crop wilting risk)")
-        if row['mintempC'] < 5:
-            anomalies.append("❄️ Extreme Cold (frost risk)")
-        if row['humidity'] > 90:
-            anomalies.append("💧 High Humidity (fungal disease risk)")
-        if row['uvIndex'] > 10:
-            anomalies.append("☀️ High UV (sunburn on crops)")
-        if row['precipMM'] > 15:
-            anomalies.append("🌧️ Heavy Rainfall (flood risk)")
-        return ", ".join(anomalies)
-    
-    filtered['Anomalies'] = filtered.apply(detect_anomalies, axis=1)
-    anomaly_data = filtered[filtered['Anomalies'] != ""]
-    
-    if anomaly_data.empty:
+    # Slice the materialized anomalies of the (city, month) partition
+    ruleset = rules.ruleset(data.get('crop'), data.get('region') or city)
+    table = anomaly_table(ruleset)
+    rows, masks = table.partition((city_key(city), month))
+    total = len(rows)
+
+    if total == 0:
         return jsonify({
             "message": f"No major anomalies detected in {city} during month {month}.",
-            "anomalies": []
+            "anomalies": [],
+            "total": 0
         })
-    
-    # Convert to list of dictionaries
-    anomalies = anomaly_data[['day', 'maxtempC', 'mintempC', 'humidity', 'uvIndex', 'precipMM', 'Anomalies']]
-    anomalies['day'] = anomalies['day'].astype(str)  # Convert dates to strings
-    
+
+    # Cursor pagination: "<table version>:<offset>", paged by `limit`
+    try:
+        version, offset = parse_cursor(data.get('cursor'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if version is not None and version != table.version:
+        return jsonify({"error": "Cursor has expired, restart from the first page"}), 409
+    try:
+        limit = min(int(data['limit']), MAX_PAGE_SIZE) if data.get('limit') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "Limit must be a positive number"}), 400
+    if limit is not None and limit <= 0:
+        return jsonify({"error": "Limit must be a positive number"}), 400
+
+    lo = min(max(offset, 0), total)
+    hi = min(total, lo + limit) if limit else total
+    next_cursor = f"{table.version}:{hi}" if hi < total else None
+    rows, masks = rows[lo:hi], masks[lo:hi]
+
+    # NDJSON streams the rows in chunks instead of building one payload
+    if (data.get('format') or request.args.get('format')) == 'ndjson':
+        headers = {'X-Total-Count': str(total)}
+        if next_cursor:
+            headers['X-Next-Cursor'] = next_cursor
+        return Response(stream_records(table.ruleset, rows, masks), mimetype='application/x-ndjson', headers=headers)
+
     return jsonify({
         "message": f"Detected anomalies in {city} during month {month}",
-        "anomalies": anomalies.to_dict(orient='records')
+        "anomalies": anomaly_records(rows, table.ruleset.label(masks)),
+        "total": total,
+        "next_cursor": next_cursor
     })
 
+# Per-column extreme reported by the aggregate query
+EXTREMES = {'maxtempC': 'max', 'mintempC': 'min', 'humidity': 'max', 'uvIndex': 'max', 'precipMM': 'max'}
+MAX_QUERY_CITIES = int(os.environ.get("WEATHER_MAX_QUERY_CITIES", "100"))
+
+def query_day(value, name):
+    if value in (None, ''):
+        return None
+    try:
+        return np.datetime64(pd.Timestamp(value).date(), 's')
+    except ValueError:
+        raise ValueError(f"Invalid {name} date '{value}'")
+
+# Row numbers of the cities' rows with start <= day <= end (either bound may
+# be None) plus each row's position in `keys`. Only the (city, month)
+# partitions the range touches are read, then appended rows of those cities.
+def rows_between(keys, start, end):
+    if start is not None and end is not None and (end - start) < np.timedelta64(366, 'D'):
+        months = sorted(set(pd.period_range(start, end, freq='M').month))
+    else:
+        months = range(1, 13)
+    ranges = [(position, *index.partitions[(key, month)]) for position, key in enumerate(keys)
+              for month in months if (key, month) in index.partitions]
+    rows = [np.arange(lo, hi) for _, lo, hi in ranges]
+    owners = [np.full(hi - lo, position) for position, lo, hi in ranges]
+
+    extra = appended.view()['city_key']
+    extra_rows = np.flatnonzero(np.isin(extra, keys))
+    positions = {key: position for position, key in enumerate(keys)}
+    rows.append(extra_rows + appended.offset)
+    owners.append(np.array([positions[key] for key in extra[extra_rows]], dtype=np.int64))
+
+    rows, owners = np.concatenate(rows).astype(np.int64), np.concatenate(owners).astype(np.int64)
+    day = appended.take('day', days, rows)
+    keep = np.ones(len(rows), dtype=bool)
+    if start is not None:
+        keep &= day >= start
+    if end is not None:
+        keep &= day <= end
+    return rows[keep], owners[keep], day[keep]
+
+def plain(value):
+    return None if pd.isna(value) else value
+
+def aggregate_records(frame, names):
+    return [{**names(key), 'rows': int(row['rows']), 'anomalies': int(row['anomalies']),
+             'extremes': {column: plain(row[column]) for column in EXTREMES}}
+            for key, row in zip(frame.index, frame.to_dict('records'))]
+
+# Anomaly counts and extremes for several cities over a date range:
+#   {"cities": [...], "start": "2023-01-01", "end": "2023-03-31", "crop": "rice",
+#    "include_rows": true, "limit": 500, "cursor": "<next_cursor of the previous page>"}
+# Rows are gathered from the index, rules are evaluated once per distinct rule
+# set and a single groupby over (city, day) yields the per-day figures; the
+# per-city figures are rolled up from those.
+@app.route('/api/weather/anomalies/query', methods=['POST'])
+def query_anomalies():
+    data = request.json or {}
+    names = data.get('cities')
+    if not isinstance(names, list) or not names:
+        return jsonify({"error": "A non-empty list of cities is required"}), 400
+    if len(names) > MAX_QUERY_CITIES:
+        return jsonify({"error": f"At most {MAX_QUERY_CITIES} cities per query"}), 400
+    try:
+        start, end = query_day(data.get('start'), 'start'), query_day(data.get('end'), 'end')
+        cursor_version, offset = parse_cursor(data.get('cursor'))
+        limit = min(int(data['limit']), MAX_PAGE_SIZE) if data.get('limit') is not None else MAX_PAGE_SIZE
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    if start is not None and end is not None and end < start:
+        return jsonify({"error": "End date is before start date"}), 400
+    if limit <= 0:
+        return jsonify({"error": "Limit must be a positive number"}), 400
+    # Read before gathering rows: a batch ingested meanwhile expires the cursor
+    version = query_version
+    if cursor_version is not None and cursor_version != version:
+        return jsonify({"error": "Cursor has expired, restart from the first page"}), 409
+
+    names = list({city_key(name): str(name) for name in reversed(names)}.values())[::-1]
+    keys = [city_key(name) for name in names]
+    rows, owners, day = rows_between(keys, start, end)
+    found = np.bincount(owners, minlength=len(keys)) > 0
+
+    # One evaluation per distinct rule set (cities without region overrides share one)
+    masks = np.zeros(len(rows), dtype=np.uint32)
+    labels = np.full(len(rows), "", dtype=object)
+    by_rule = {}
+    rulesets = {}
+    for position, name in enumerate(names):
+        rulesets.setdefault(rules.ruleset(data.get('crop'), name), []).append(position)
+    for ruleset, positions in rulesets.items():
+        selected = np.flatnonzero(np.isin(owners, positions))
+        masks[selected] = ruleset.evaluate({column: appended.take(column, columns[column], rows[selected])
+                                            for column in ruleset.columns})
+        labels[selected] = ruleset.label(masks[selected])
+        for bit, rule in enumerate(ruleset.rules):
+            hits = np.bincount(owners[selected], weights=masks[selected] >> bit & 1, minlength=len(keys))
+            by_rule.setdefault(rule['name'], np.zeros(len(keys)))[:] += hits
+
+    frame = pd.DataFrame({'city': owners, 'day': day, 'anomalous': masks != 0,
+                          **{column: appended.take(column, columns[column], rows) for column in EXTREMES}})
+    daily = frame.groupby(['city', 'day'], sort=True).agg(
+        rows=('anomalous', 'size'), anomalies=('anomalous', 'sum'),
+        **{column: (column, how) for column, how in EXTREMES.items()})
+    per_city = daily.groupby(level='city').agg(
+        rows=('rows', 'sum'), anomalies=('anomalies', 'sum'),
+        **{column: (column, how) for column, how in EXTREMES.items()})
+
+    cities = aggregate_records(per_city, lambda position: {'city': names[position]})
+    for city, position in zip(cities, per_city.index):
+        city['by_rule'] = {name: int(counts[position]) for name, counts in by_rule.items() if counts[position]}
+    result = {
+        "cities": cities,
+        "days": aggregate_records(daily, lambda key: {
+            'city': names[key[0]], 'day': key[1].date().isoformat()}),
+        "unknown_cities": [name for name, hit in zip(names, found) if not hit],
+    }
+
+    # Optional raw anomalous rows, by city then day, paged by a "<version>:<offset>" cursor
+    if data.get('include_rows'):
+        anomalous = np.flatnonzero(masks)
+        anomalous = anomalous[np.lexsort((rows[anomalous], day[anomalous], owners[anomalous]))]
+        page = anomalous[offset:offset + limit]
+        records = anomaly_records(rows[page], labels[page])
+        for record, position in zip(records, owners[page].tolist()):
+            record['city'] = names[position]
+        result.update({
+            "anomalies": records,
+            "total": len(anomalous),
+            "next_cursor": f"{version}:{offset + limit}" if offset + limit < len(anomalous) else None,
+        })
+    return jsonify(result)
+
+# Append observations (a JSON list, {"observations": [...]}, or text/csv);
+# they are logged to the ingest directory and show up in anomaly queries at once.
+# Rows missing a column in INGEST_REQUIRED are rejected.
+@app.route('/api/weather/ingest', methods=['POST'])
+def ingest_observations():
+    try:
+        if request.mimetype == 'text/csv':
+            frame = pd.read_csv(io.StringIO(request.get_data(as_text=True)))
+        else:
+            data = request.json
+            frame = pd.DataFrame(data.get('observations', []) if isinstance(data, dict) else data)
+        rows = ingest_log.submit(frame, apply_observations)
+    except (ValueError, pd.errors.ParserError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"ingested": rows, "rejected": len(frame) - rows})
+
+# Effective rules for an optional crop/region
+@app.route('/api/weather/rules', methods=['GET'])
+def get_rules():
+    ruleset = rules.ruleset(request.args.get('crop'), request.args.get('region'))
+    return jsonify(ruleset.describe())
+
 @app.route('/')
 def home():
     return "Weather Anomaly Detection API is running!"
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+
+# Normalized city key used for every lookup
+def city_key(city):
+    return str(city).strip().lower()
+
+
+# Weather rows partitioned by (city, month).
+# Cities are normalized once, rows are stably sorted by (city, month) so each
+# partition is a contiguous block in file order, and `partitions` maps
+# (city_key, month) -> (start, stop). A lookup is a dict hit plus a slice.
+# Frames that are already in that order (see weather_store) are used as is.
+class WeatherIndex:
+    def __init__(self, df):
+        city = df['city']
+        if isinstance(city.dtype, pd.CategoricalDtype):
+            # Normalize the categories, not every row
+            names = city.cat.categories.astype(str).str.strip().str.lower()
+            uniques, inverse = np.unique(np.asarray(names, dtype=str), return_inverse=True)
+            codes = inverse[city.cat.codes.to_numpy()]
+        else:
+            codes, uniques = pd.factorize(city.astype(str).str.strip().str.lower(), sort=True)
+        months = df['month'].to_numpy(dtype=np.int64)
+
+        partition_ids = codes * 13 + months
+        if (np.diff(partition_ids) < 0).any():
+            order = np.argsort(partition_ids, kind='stable')
+            df, codes, months, partition_ids = (df.iloc[order].reset_index(drop=True), codes[order],
+                                                months[order], partition_ids[order])
+        self.frame = pd.concat([df, pd.Series(pd.Categorical.from_codes(codes, uniques), name='city_key')],
+                               axis=1)
+
+        bounds = np.flatnonzero(np.diff(partition_ids)) + 1
+        starts = np.concatenate(([0], bounds)).astype(np.int64)
+        stops = np.concatenate((bounds, [len(partition_ids)])).astype(np.int64)
+        self.partitions = {
+            (str(uniques[codes[start]]), int(months[start])): (int(start), int(stop))
+            for start, stop in zip(starts, stops)
+        } if len(partition_ids) else {}
+
+        self.cities = sorted(self.frame['city'].unique().tolist())
+        self.months = sorted(np.unique(months).tolist())
+
+    def bounds(self, city, month):
+        return self.partitions.get((city_key(city), int(month)), (0, 0))
+
+    def partition(self, city, month):
+        start, stop = self.bounds(city, month)
+        return self.frame.iloc[start:stop]
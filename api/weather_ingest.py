@@ -0,0 +1,140 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from weather_store import parse_dates
+
+# Incremental ingest of new hourly observations.
+#
+# Batches arrive either through a service's POST endpoint or as CSV files
+# dropped into INGEST_DIR (WEATHER_INGEST_DIR, default weather_ingest). Every
+# batch is kept there as a chunk file, so the directory is both the drop box
+# and the log: a restarted service replays it on top of the weather store, and
+# services sharing the directory pick up each other's batches.
+# Files are picked up in name order; write drops under a dotted name and
+# rename them when complete. Applying a batch only touches the new rows.
+INGEST_DIR = os.environ.get("WEATHER_INGEST_DIR", "weather_ingest")
+INGEST_INTERVAL = float(os.environ.get("WEATHER_INGEST_INTERVAL", "5"))
+REQUIRED_COLUMNS = ('city', 'date_time')
+
+logger = logging.getLogger("weather_ingest")
+
+
+# Validate a batch and add the derived columns of the weather table
+# (city_key, month, day); numeric columns are coerced, and rows with a bad date
+# or without a value in every `required` column are dropped
+def prepare(frame, numeric_columns=(), required=()):
+    missing = [column for column in REQUIRED_COLUMNS if column not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    frame = frame.reset_index(drop=True)
+    stamps = parse_dates(frame['date_time'].astype(str))
+    frame = frame[stamps.notna().to_numpy()].copy()
+    frame['date_time'] = stamps.dropna().to_numpy(dtype='datetime64[ns]')
+    for column in numeric_columns:
+        frame[column] = (pd.to_numeric(frame[column], errors='coerce') if column in frame.columns
+                         else np.nan)
+    if required:
+        frame = frame[frame[list(required)].notna().all(axis=1)]
+    frame['city'] = frame['city'].astype(str).str.strip()
+    frame['city_key'] = frame['city'].str.lower()  # city_key(), vectorized
+    stamps = frame['date_time'].to_numpy()
+    frame['month'] = (stamps.astype('datetime64[M]').astype(np.int64) % 12 + 1).astype(np.int8)
+    frame['day'] = stamps.astype('datetime64[D]').astype('datetime64[s]')
+    return frame.reset_index(drop=True)
+
+
+# Chunk files of the ingest directory and which of them have been applied
+class IngestLog:
+    def __init__(self, directory=INGEST_DIR):
+        self.directory = directory
+        self.applied = set()
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # Persist a batch as a new chunk file (atomic rename), returning its name
+    def write(self, frame):
+        name = f"chunk-{time.time_ns():020d}-{os.getpid()}.csv"
+        tmp = os.path.join(self.directory, f".{name}.tmp")
+        frame.to_csv(tmp, index=False)
+        os.replace(tmp, os.path.join(self.directory, name))
+        return name
+
+    def pending(self):
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.endswith('.csv') and not name.startswith('.') and name not in self.applied)
+
+    # Apply every chunk not seen yet; unreadable files are logged and skipped
+    def poll(self, apply):
+        rows = 0
+        with self.lock:
+            for name in self.pending():
+                self.applied.add(name)
+                try:
+                    rows += apply(pd.read_csv(os.path.join(self.directory, name)))
+                except Exception:
+                    logger.exception("Skipping ingest file %s", name)
+        return rows
+
+    # Apply a batch received by a service and log it; a batch that fails
+    # validation or has no usable rows is not written
+    def submit(self, frame, apply):
+        with self.lock:
+            rows = apply(frame)
+            if rows:
+                self.applied.add(self.write(frame))
+            return rows
+
+    # Poll the directory for dropped files on a daemon thread
+    def watch(self, apply, interval=INGEST_INTERVAL):
+        def run():
+            while True:
+                time.sleep(interval)
+                self.poll(apply)
+        thread = threading.Thread(target=run, name="weather-ingest", daemon=True)
+        thread.start()
+        return thread
+
+
+# Columns of rows appended behind a base table of `offset` rows. Row numbers
+# continue from the base table; capacity doubles, so appends cost O(new rows).
+class AppendedColumns:
+    def __init__(self, offset, dtypes):
+        self.offset = offset
+        self.size = 0
+        self.arrays = {name: np.empty(0, dtype=dtype) for name, dtype in dtypes.items()}
+
+    # Append a prepared batch, returning the row number of its first row
+    def append(self, frame):
+        start, stop = self.size, self.size + len(frame)
+        for name, array in self.arrays.items():
+            if stop > len(array):
+                grown = np.empty(max(stop, 2 * len(array), 1024), dtype=array.dtype)
+                grown[:start] = array[:start]
+                array = self.arrays[name] = grown
+            array[start:stop] = frame[name].to_numpy(dtype=array.dtype)
+        self.size = stop
+        return self.offset + start
+
+    # Appended rows so far, as name -> array
+    def view(self):
+        return {name: array[:self.size] for name, array in self.arrays.items()}
+
+    # Values of `name` at table rows `rows`, reading `base` below the offset.
+    # Appended values keep an integer base column's dtype when they are whole.
+    def take(self, name, base, rows):
+        appended = rows >= self.offset
+        if not appended.any():
+            return base[rows]
+        extra = self.arrays[name][rows[appended] - self.offset]
+        dtype = np.result_type(base.dtype, extra.dtype)
+        if base.dtype.kind in 'iu' and np.array_equal(extra, np.round(extra)):
+            dtype = base.dtype
+        values = np.empty(len(rows), dtype=dtype)
+        values[~appended] = base[rows[~appended]]
+        values[appended] = extra
+        return values
@@ -0,0 +1,156 @@
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+import atomic_dir
+
+# Columnar cache of weather_data.csv.
+#
+# The CSV is parsed once into a directory of .npy columns plus manifest.json:
+# timestamps as datetime64[ns], cities (and any other text column) as int32
+# codes into a category list, month and day precomputed. Rows are stored in
+# (city, month) order, file order within each block, so WeatherIndex can use
+# them without re-sorting. Columns are opened with mmap_mode='r'; a service
+# start reads no CSV and parses no dates.
+FORMAT_VERSION = 2
+DATE_FORMAT = '%d-%m-%Y %H:%M'
+DEFAULT_SOURCE = os.environ.get("WEATHER_DATA", "weather_data.csv")
+DEFAULT_STORE = os.environ.get("WEATHER_STORE", "weather_store")
+
+
+# Size and mtime of the CSV, so a changed source triggers a rebuild
+def csv_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def parse_dates(values):
+    parsed = pd.to_datetime(values, format=DATE_FORMAT, errors='coerce')
+    # Rows in another layout (e.g. ISO) fall back to day-first inference
+    retry = parsed.isna() & values.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry], dayfirst=True, format='mixed', errors='coerce')
+    return parsed
+
+
+# Parse the CSV in chunks into typed column arrays, in (city, month) order.
+# A column's type is fixed by the first chunk: numeric columns coerce later
+# chunks with to_numeric (stray text becomes NaN), text columns code theirs
+# as strings, so one column never mixes raw values and codes.
+def read_columns(source, chunksize=1_000_000):
+    categories = {}  # text column -> {value: code}
+    numeric = {}  # column -> whether it is stored as numbers
+    parts = {}
+    dropped = 0
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        stamps = parse_dates(chunk['date_time'])
+        valid = stamps.notna().to_numpy()
+        dropped += int((~valid).sum())
+        chunk, stamps = chunk[valid], stamps[valid]
+
+        parts.setdefault('date_time', []).append(stamps.to_numpy(dtype='datetime64[ns]'))
+        for column in chunk.columns.drop('date_time'):
+            values = chunk[column]
+            if numeric.setdefault(column, pd.api.types.is_numeric_dtype(values)):
+                parts.setdefault(column, []).append(pd.to_numeric(values, errors='coerce').to_numpy())
+                continue
+            lookup = categories.setdefault(column, {})
+            for value in pd.unique(values.astype(str)):
+                lookup.setdefault(value, len(lookup))
+            parts.setdefault(column, []).append(
+                values.astype(str).map(lookup).to_numpy(dtype=np.int32))
+
+    columns = {name: np.concatenate(arrays) for name, arrays in parts.items()}
+    stamps = columns['date_time']
+    columns['month'] = (stamps.astype('datetime64[M]').astype(np.int64) % 12 + 1).astype(np.int8)
+    columns['day'] = stamps.astype('datetime64[D]').astype('datetime64[s]')
+
+    # Stable (city key, month) order: contiguous partitions in file order
+    city_names = np.array(list(categories['city']), dtype=object)
+    city_keys = pd.Index(city_names).str.strip().str.lower()
+    key_uniques, key_codes = np.unique(np.asarray(city_keys, dtype=str), return_inverse=True)
+    partition = key_codes[columns['city']].astype(np.int64) * 13 + columns['month']
+    order = np.argsort(partition, kind='stable')
+    columns = {name: values[order] for name, values in columns.items()}
+
+    return columns, {column: list(lookup) for column, lookup in categories.items()}, dropped
+
+
+def build_store(source=DEFAULT_SOURCE, out_dir=DEFAULT_STORE):
+    stamp = csv_stamp(source)
+    columns, categories, dropped = read_columns(source)
+
+    staging = atomic_dir.staging(out_dir)
+    try:
+        for name, values in columns.items():
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(values))
+        with open(os.path.join(staging, "manifest.json"), "w") as f:
+            json.dump({
+                'format': FORMAT_VERSION,
+                'source': {'path': os.path.abspath(source), 'stamp': stamp},
+                'columns': list(columns),
+                'categories': categories,
+                'rows': len(columns['date_time']),
+                'dropped_rows': dropped,
+            }, f, indent=2)
+        # Swap the whole directory in at once; readers never see a missing or
+        # partial store, and a concurrent rebuild by another worker is harmless
+        atomic_dir.publish(staging, out_dir)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+# manifest of an up-to-date store, or None when it is missing or stale
+def current_manifest(source=DEFAULT_SOURCE, out_dir=DEFAULT_STORE):
+    try:
+        with open(os.path.join(out_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format') != FORMAT_VERSION:
+        return None
+    try:
+        if manifest['source']['stamp'] != csv_stamp(source):
+            return None
+    except OSError:
+        pass  # Source removed: the store is all we have
+    return manifest
+
+
+def open_store(out_dir=DEFAULT_STORE, manifest=None):
+    out_dir = atomic_dir.resolve(out_dir)  # Every file from one version
+    if manifest is None:
+        with open(os.path.join(out_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+
+    columns = []
+    for name in manifest['columns']:
+        values = np.load(os.path.join(out_dir, f"{name}.npy"), mmap_mode='r')
+        if name in manifest['categories']:
+            values = pd.Categorical.from_codes(values, manifest['categories'][name])
+        columns.append(pd.Series(values, name=name, copy=False))
+    # concat keeps one block per column; the DataFrame constructor would
+    # consolidate same-dtype columns into a fresh in-memory copy
+    return pd.concat(columns, axis=1)
+
+
+# The weather table as a DataFrame, rebuilding the store only when the CSV changed
+def load_weather(source=DEFAULT_SOURCE, out_dir=DEFAULT_STORE):
+    manifest = current_manifest(source, out_dir)
+    if manifest is None:
+        build_store(source, out_dir)
+    return open_store(out_dir, manifest)
+
+
+# Build step: python weather_store.py [weather_data.csv [weather_store]]
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SOURCE
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_STORE
+    build_store(source, out_dir)
+    manifest = current_manifest(source, out_dir)
+    print(f"Wrote {manifest['rows']} rows ({manifest['dropped_rows']} dropped) to {out_dir}")
@@ -1,20 +1,28 @@
 from flask import Flask, jsonify, request
-import joblib
+import io
+import threading
+import time
+import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
 
+from model_registry import ModelRegistry
+from incremental import IncrementalTrainer
+from train_models import DEFAULT_DATA_PATH, load_dataset
+
 app = Flask(__name__)
 
-# Function to train and save the model
-def train_and_save_model():
-    # Load the dataset (adjust path as needed)
-    data = pd.read_csv(r'C:\Users\ayush\OneDrive\Desktop\BitBuzz\client\vite-project\Crop_recommendation.csv')
+# Versioned models live under backend/models; the promoted one is kept in memory
+registry = ModelRegistry('backend/models')
+
+# Function to train a model and report its metadata
+def train_model():
+    started = time.time()
 
-    # Prepare features and target
-    X = data.drop('target', axis=1)  # Features
-    y = data['target']  # Target variable
+    # Load the dataset (CROP_DATA_PATH, defaults to the repo's Crop_recommendation.csv)
+    X, y, data_hash = load_dataset()
 
     # Split the data into training and testing sets
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -28,19 +36,53 @@ def train_and_save_model():
     accuracy = accuracy_score(y_test, y_pred)
     print(f'Model Accuracy: {accuracy * 100:.2f}%')
 
-    # Save the trained model
-    joblib.dump(model, 'backend/models/model.joblib')  # Save model in the models folder
+    return model, {
+        'accuracy': accuracy,
+        'training_seconds': round(time.time() - started, 3),
+        'data_hash': data_hash,
+        'n_samples': len(X),
+        'model': type(model).__name__,
+    }
+
+# Function to train and save the model as a new promoted version
+def train_and_save_model():
+    model, meta = train_model()
+    registry.register(model, meta)
     return model
 
+# Online learning from field samples: ingested rows are appended as chunks and
+# folded into a GaussianNB by partial_fit. Each update is registered as a version
+# but not promoted: its prequential accuracy is not comparable with the holdout
+# accuracy of the trained model, so promotion stays explicit (/models/<v>/promote).
+# The trainer is set up on first use: its classes come from the training CSV
+# (either label column schema) and the log is seeded from it once, so the
+# service still starts without the CSV.
+trainer = None
+trainer_lock = threading.Lock()
+
+def get_trainer():
+    global trainer
+    with trainer_lock:
+        if trainer is None:
+            _, y, _ = load_dataset()
+            online = IncrementalTrainer('backend/models/incremental', np.unique(y.astype(str)))
+            online.seed(DEFAULT_DATA_PATH)
+            trainer = online
+        return trainer
+
+# Load the promoted model once at startup (falls back to the old single-file model)
+registry.load_current(legacy_path='backend/models/model.joblib')
+
 # API endpoint to recommend crops
 @app.route('/recommend-crops', methods=['POST'])
 def recommend_crops():
-    # Check if model exists, else train it
-    try:
-        model = joblib.load('backend/models/model.joblib')  # Try loading the pre-trained model
-    except FileNotFoundError:
-        print("Model not found, training a new model.")
-        model = train_and_save_model()  # Train the model if not found
+    # Check if a model is loaded, else train one in the background
+    current = registry.current
+    if current is None:
+        if registry.start_training(train_model):
+            print("Model not found, training a new model in the background.")
+        return jsonify({'error': 'Model is not ready yet, training in progress'}), 503
+    version, model, _ = current
 
     # Get the user input from the request body
     data = request.get_json()
@@ -58,7 +100,55 @@ def recommend_crops():
     prediction = model.predict(input_data)
 
     # Return the recommendation
-    return jsonify({'recommendation': prediction.tolist()})
+    return jsonify({'recommendation': prediction.tolist(), 'model_version': version})
+
+# Model registry: list versions, retrain in the background, promote/roll back
+@app.route('/models', methods=['GET'])
+def list_models():
+    return jsonify({'versions': registry.versions(), **registry.status()})
+
+@app.route('/models/train', methods=['POST'])
+def retrain_model():
+    started = registry.start_training(train_model)
+    return jsonify({'started': started, **registry.status()}), 202 if started else 409
+
+@app.route('/models/<version>/promote', methods=['POST'])
+def promote_model(version):
+    try:
+        registry.promote(version)
+    except FileNotFoundError:
+        return jsonify({'error': f"Unknown model version '{version}'"}), 404
+    return jsonify(registry.status())
+
+# Append labeled samples (JSON list or CSV body) and update the online model.
+# Chunks that arrive while an update is running are picked up before it ends,
+# or by a rerun queued behind it.
+@app.route('/samples', methods=['POST'])
+def ingest_samples():
+    try:
+        trainer = get_trainer()
+    except (OSError, ValueError, KeyError) as e:
+        return jsonify({'error': f'Online training is unavailable: {e}'}), 503
+    try:
+        if request.mimetype == 'text/csv':
+            frame = pd.read_csv(io.StringIO(request.get_data(as_text=True)))
+        else:
+            data = request.get_json()
+            frame = pd.DataFrame(data['samples'] if isinstance(data, dict) else data)
+        chunk = trainer.ingest(frame)
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    started = registry.start_training(trainer.apply_pending, promote=False, rerun=True)
+    return jsonify({'chunk': chunk, 'rows': len(frame), 'training_started': started,
+                    **trainer.status()}), 202
+
+@app.route('/samples/status', methods=['GET'])
+def samples_status():
+    try:
+        trainer = get_trainer()
+    except (OSError, ValueError, KeyError) as e:
+        return jsonify({'error': f'Online training is unavailable: {e}'}), 503
+    return jsonify({**trainer.status(), **registry.status()})
 
 if __name__ == '__main__':
     app.run(debug=True)
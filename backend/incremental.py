@@ -0,0 +1,176 @@
+import copy
+import json
+import os
+import tempfile
+import threading
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.naive_bayes import GaussianNB
+
+from train_models import FEATURES
+
+
+# Online training from streamed labeled samples.
+#
+# Layout under `root`:
+#   chunks/chunk-<seq>.csv   append-only log of ingested rows (FEATURES + label)
+#   checkpoint.joblib        {'model', 'applied', 'rows_seen', 'quarantined'} after the last applied chunk
+#
+# Ingest only writes a new chunk file. apply_pending() feeds every chunk past
+# the checkpoint to GaussianNB.partial_fit, whose per-class means and variances
+# merge exactly, so the model matches one fitted on the full history (up to the
+# variance-smoothing term) while an update costs only the new rows. The
+# checkpoint is rewritten atomically after each chunk, so a crash resumes from
+# the last finished chunk. A chunk that cannot be learned is quarantined (skipped
+# with its reason recorded) rather than retried on every update.
+class IncrementalTrainer:
+    def __init__(self, root, classes, batch_rows=50000):
+        self.root = root
+        self.chunks_dir = os.path.join(root, "chunks")
+        self.checkpoint_path = os.path.join(root, "checkpoint.joblib")
+        self.classes = np.array(sorted(classes))
+        self.batch_rows = batch_rows
+        self._lock = threading.Lock()
+        os.makedirs(self.chunks_dir, exist_ok=True)
+
+    def chunks(self):
+        return sorted(name for name in os.listdir(self.chunks_dir)
+                      if name.startswith("chunk-") and name.endswith(".csv"))
+
+    # Validate and append labeled rows as a new chunk; returns the chunk name
+    def ingest(self, frame):
+        frame = self._validate(frame)
+        with self._lock:
+            return self._write_chunk(frame)
+
+    def _validate(self, frame):
+        missing = [column for column in FEATURES + ['label'] if column not in frame.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        frame = frame[FEATURES + ['label']].copy()
+        frame[FEATURES] = frame[FEATURES].apply(pd.to_numeric, errors='raise')
+        # Nulls pass to_numeric as NaN; partial_fit would reject the chunk later
+        invalid = ~np.isfinite(frame[FEATURES].to_numpy(dtype=float)).all(axis=1)
+        if invalid.any():
+            rows = ', '.join(str(row) for row in np.flatnonzero(invalid)[:10])
+            raise ValueError(f"Missing or non-finite feature values in rows: {rows}")
+        frame['label'] = frame['label'].astype(str).str.strip()
+        unknown = sorted(set(frame['label']) - set(self.classes))
+        if unknown:
+            raise ValueError(f"Unknown labels: {', '.join(unknown)}")
+        if frame.empty:
+            raise ValueError("No samples provided")
+        return frame
+
+    # Next chunk in sequence; the caller holds self._lock
+    def _write_chunk(self, frame):
+        chunks = self.chunks()
+        seq = int(chunks[-1][6:-4]) + 1 if chunks else 1
+        name = f"chunk-{seq:08d}.csv"
+        # Write then rename, so the trainer never reads a partial chunk
+        fd, staging = tempfile.mkstemp(dir=self.chunks_dir, prefix=".staging-")
+        with os.fdopen(fd, "w", newline="") as f:
+            frame.to_csv(f, index=False)
+        os.replace(staging, os.path.join(self.chunks_dir, name))
+        return name
+
+    # Seed an empty log from an existing CSV, streamed in batch_rows pieces.
+    # Holds the lock throughout, so concurrent callers seed only once.
+    def seed(self, csv_path):
+        with self._lock:
+            if self.chunks():
+                return 0
+            rows = 0
+            for frame in pd.read_csv(csv_path, chunksize=self.batch_rows):
+                if 'label' not in frame.columns:
+                    frame = frame.rename(columns={'target': 'label'})
+                self._write_chunk(self._validate(frame))
+                rows += len(frame)
+            return rows
+
+    def load_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            return joblib.load(self.checkpoint_path)
+        return {'model': None, 'applied': None, 'rows_seen': 0, 'quarantined': {}}
+
+    def _save_checkpoint(self, state):
+        staging = self.checkpoint_path + ".tmp"
+        joblib.dump(state, staging)
+        os.replace(staging, self.checkpoint_path)
+
+    def pending(self, state=None):
+        applied = (state or self.load_checkpoint())['applied']
+        return [name for name in self.chunks() if applied is None or name > applied]
+
+    # Fold every chunk past the checkpoint into the model -> (model, meta), or
+    # None when no new rows were learned. Loops until no chunk is pending, so
+    # chunks ingested meanwhile are included.
+    # Each chunk is scored before it is learned (prequential accuracy).
+    def apply_pending(self):
+        started = time.time()
+        state = self.load_checkpoint()
+        state.setdefault('quarantined', {})
+        model = state['model'] or GaussianNB()
+        new_rows, correct, scored = 0, 0, 0
+
+        while pending := self.pending(state):
+            for name in pending:
+                # Learn on a copy so a chunk failing halfway leaves no trace
+                candidate, rows, chunk_correct, chunk_scored = copy.deepcopy(model), 0, 0, 0
+                try:
+                    for frame in pd.read_csv(os.path.join(self.chunks_dir, name), chunksize=self.batch_rows):
+                        X, y = frame[FEATURES].to_numpy(dtype=float), frame['label'].astype(str).to_numpy()
+                        if state['rows_seen'] + rows:
+                            chunk_correct += int((candidate.predict(X) == y).sum())
+                            chunk_scored += len(y)
+                        candidate.partial_fit(X, y, classes=self.classes)
+                        rows += len(y)
+                except Exception as e:
+                    state['quarantined'][name] = str(e)
+                else:
+                    model = candidate
+                    state['rows_seen'] += rows
+                    new_rows += rows
+                    correct += chunk_correct
+                    scored += chunk_scored
+                state.update(model=model if state['rows_seen'] else None, applied=name)
+                self._save_checkpoint(state)
+
+        if state['model'] is None:
+            raise ValueError("No samples to train on")
+        if not new_rows:
+            return None
+        return model, {
+            'accuracy': correct / scored if scored else None,
+            'training_seconds': round(time.time() - started, 3),
+            'n_samples': state['rows_seen'],
+            'new_samples': new_rows,
+            'last_chunk': state['applied'],
+            'model': type(model).__name__,
+            'source': 'incremental',
+        }
+
+    def status(self):
+        state = self.load_checkpoint()
+        return {
+            'chunks': len(self.chunks()),
+            'pending_chunks': len(self.pending(state)),
+            'last_applied': state['applied'],
+            'rows_seen': state['rows_seen'],
+            'quarantined': state.get('quarantined', {}),
+        }
+
+
+# Apply any pending chunks once, e.g. after a crash: python incremental.py [root]
+if __name__ == '__main__':
+    import sys
+    from train_models import DEFAULT_DATA_PATH, load_dataset
+    root = sys.argv[1] if len(sys.argv) > 1 else "backend/models/incremental"
+    _, labels, _ = load_dataset(DEFAULT_DATA_PATH)
+    trainer = IncrementalTrainer(root, np.unique(labels.astype(str)))
+    trainer.seed(DEFAULT_DATA_PATH)
+    result = trainer.apply_pending()
+    print(json.dumps(result[1] if result else trainer.status(), indent=2))
@@ -0,0 +1,133 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+
+
+# Versioned model artifacts on disk plus the promoted model held in memory.
+#
+# Layout under `root`:
+#   versions/<version>/model.joblib   the fitted estimator
+#   versions/<version>/meta.json      accuracy, training time, data hash, ...
+#   current.json                      {"version": ...} of the promoted model
+#
+# Request threads only ever read `self.current`, a (version, model, meta) tuple
+# that is replaced with a single assignment on promotion, so they never wait on
+# disk I/O or training. Training runs on one background worker.
+class ModelRegistry:
+    def __init__(self, root):
+        self.root = root
+        self.versions_dir = os.path.join(root, "versions")
+        self.current = None
+        self.training = None
+        self.last_error = None
+        self._rerun = None
+        self._lock = threading.Lock()
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-training")
+        os.makedirs(self.versions_dir, exist_ok=True)
+
+    def versions(self):
+        metas = []
+        for version in os.listdir(self.versions_dir):
+            meta_path = os.path.join(self.versions_dir, version, "meta.json")
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    metas.append(json.load(f))
+        return sorted(metas, key=lambda meta: meta["created_at"])
+
+    def _next_version(self):
+        numbers = [int(name[1:]) for name in os.listdir(self.versions_dir)
+                   if name.startswith("v") and name[1:].isdigit()]
+        return f"v{max(numbers, default=0) + 1}"
+
+    # Load the promoted version (or a legacy single-file model) into memory
+    def load_current(self, legacy_path=None):
+        pointer = os.path.join(self.root, "current.json")
+        if os.path.exists(pointer):
+            with open(pointer) as f:
+                version = json.load(f)["version"]
+            self.promote(version)
+        elif legacy_path and os.path.exists(legacy_path):
+            self.register(joblib.load(legacy_path), {'source': legacy_path})
+        return self.current
+
+    # Write a new version directory, then promote it
+    def register(self, model, meta, promote=True):
+        with self._lock:
+            version = self._next_version()
+            meta = {**meta, 'version': version, 'created_at': time.time()}
+            # Build in a temp dir and rename, so a version directory is always complete
+            staging = tempfile.mkdtemp(dir=self.versions_dir, prefix=".staging-")
+            try:
+                joblib.dump(model, os.path.join(staging, "model.joblib"))
+                with open(os.path.join(staging, "meta.json"), "w") as f:
+                    json.dump(meta, f, indent=2)
+                os.replace(staging, os.path.join(self.versions_dir, version))
+            except Exception:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+        if promote:
+            self._publish(version, model, meta)
+        return version
+
+    def promote(self, version):
+        version_dir = os.path.join(self.versions_dir, version)
+        if version.startswith(".") or os.path.basename(version) != version or not os.path.isdir(version_dir):
+            raise FileNotFoundError(f"Unknown model version '{version}'")
+        model = joblib.load(os.path.join(version_dir, "model.joblib"))
+        with open(os.path.join(version_dir, "meta.json")) as f:
+            meta = json.load(f)
+        self._publish(version, model, meta)
+
+    def _publish(self, version, model, meta):
+        with self._lock:
+            pointer = os.path.join(self.root, "current.json")
+            with open(pointer + ".tmp", "w") as f:
+                json.dump({'version': version}, f)
+            os.replace(pointer + ".tmp", pointer)
+            self.current = (version, model, meta)
+
+    # Run train_fn() -> (model, meta) on the background worker and register the
+    # result, promoting it if `promote`; train_fn may return None when there is
+    # nothing new. Returns False when a training job is already running; with
+    # `rerun`, that job then runs train_fn once more when it finishes, so work
+    # queued meanwhile is not left waiting.
+    def start_training(self, train_fn, promote=True, rerun=False):
+        with self._lock:
+            if self.training is not None:
+                if rerun:
+                    self._rerun = (train_fn, promote)
+                return False
+            self.training = {'started_at': time.time()}
+        self._worker.submit(self._train, train_fn, promote)
+        return True
+
+    def _train(self, train_fn, promote):
+        while True:
+            try:
+                result = train_fn()
+                if result is not None:
+                    self.register(*result, promote=promote)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Model training failed: {str(e)}")
+            with self._lock:
+                queued, self._rerun = self._rerun, None
+                if queued is None:
+                    self.training = None
+                    return
+            train_fn, promote = queued
+
+    def status(self):
+        current = self.current
+        return {
+            'current': current[2] if current else None,
+            'training': self.training,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,202 @@
+import argparse
+import hashlib
+import io
+import itertools
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import StratifiedKFold, cross_val_score, train_test_split
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import MinMaxScaler
+from sklearn.tree import DecisionTreeClassifier
+
+# Training pipeline and model-selection benchmark for the crop recommender.
+#
+# Every (candidate, parameters) combination is cross-validated in its own
+# process, then refit on the training split and profiled the way production
+# uses it: fit time, single-row predict latency, batch throughput and the size
+# of the pickled artifact, alongside CV and holdout accuracy.
+#
+#   python backend/train_models.py --data Crop_recommendation.csv --jobs 4
+
+DEFAULT_DATA_PATH = os.environ.get(
+    'CROP_DATA_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Crop_recommendation.csv'),
+)
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+CANDIDATES = {
+    'random_forest': (RandomForestClassifier(random_state=42),
+                      {'n_estimators': [50, 100, 200], 'max_depth': [None, 12]}),
+    'extra_trees': (ExtraTreesClassifier(random_state=42),
+                    {'n_estimators': [100, 200], 'max_depth': [None, 12]}),
+    'decision_tree': (DecisionTreeClassifier(random_state=42),
+                      {'max_depth': [None, 12]}),
+    'knn': (make_pipeline(MinMaxScaler(), KNeighborsClassifier()),
+            {'kneighborsclassifier__n_neighbors': [3, 7]}),
+    'logistic_regression': (make_pipeline(MinMaxScaler(), LogisticRegression(max_iter=2000)),
+                            {'logisticregression__C': [1.0, 10.0]}),
+    'naive_bayes': (GaussianNB(), {}),
+}
+
+
+# Features, target and the sha256 of the raw CSV bytes. Accepts the repo's
+# 'label' column or the older 'target' column.
+def load_dataset(path=DEFAULT_DATA_PATH):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    data = pd.read_csv(io.BytesIO(raw))
+    target = 'label' if 'label' in data.columns else 'target'
+    return data[FEATURES], data[target], hashlib.sha256(raw).hexdigest()
+
+
+def expand_candidates(names=None):
+    jobs = []
+    for name, (estimator, grid) in CANDIDATES.items():
+        if names and name not in names:
+            continue
+        keys = sorted(grid)
+        for values in itertools.product(*(grid[key] for key in keys)):
+            jobs.append((name, estimator, dict(zip(keys, values))))
+    return jobs
+
+
+def _median_seconds(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings))
+
+
+# Cross-validate and refit one candidate; runs inside a worker process
+def evaluate(name, estimator, params, X_train, y_train, X_test, y_test, folds=5):
+    model = clone(estimator).set_params(**params)
+    cv = StratifiedKFold(n_splits=folds, shuffle=True, random_state=42)
+    cv_scores = cross_val_score(model, X_train, y_train, cv=cv)
+
+    started = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - started
+
+    return {
+        'name': name,
+        'params': params,
+        'cv_accuracy': float(cv_scores.mean()),
+        'cv_std': float(cv_scores.std()),
+        'holdout_accuracy': float(accuracy_score(y_test, model.predict(X_test))),
+        'fit_seconds': round(fit_seconds, 4),
+    }, model
+
+
+# Serving costs of a fitted model. Measured in the parent after the pool has
+# finished, so the timings are not skewed by workers competing for cores.
+def profile(model, X_test, latency_repeat=50, batch_rows=10000):
+    single_row = X_test.iloc[:1]
+    batch = X_test.iloc[np.resize(np.arange(len(X_test)), batch_rows)]
+    latency = _median_seconds(lambda: model.predict(single_row), latency_repeat)
+    batch_seconds = _median_seconds(lambda: model.predict(batch), 3)
+    return {
+        'single_row_latency_ms': round(latency * 1000, 3),
+        'batch_rows_per_second': round(batch_rows / batch_seconds),
+        'artifact_bytes': len(pickle.dumps(model)),
+    }
+
+
+# Best candidate by CV accuracy among those meeting the production limits
+def select_model(results, max_latency_ms=None, max_artifact_bytes=None, min_accuracy=None):
+    eligible = [
+        result for result in results
+        if (max_latency_ms is None or result['single_row_latency_ms'] <= max_latency_ms)
+        and (max_artifact_bytes is None or result['artifact_bytes'] <= max_artifact_bytes)
+        and (min_accuracy is None or result['cv_accuracy'] >= min_accuracy)
+    ]
+    if not eligible:
+        return None
+    return max(eligible, key=lambda result: (result['cv_accuracy'], -result['single_row_latency_ms']))
+
+
+def run_benchmark(data_path=DEFAULT_DATA_PATH, names=None, jobs=None, folds=5, test_size=0.2):
+    X, y, data_hash = load_dataset(data_path)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=42, stratify=y)
+
+    results, models = [], []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(evaluate, name, estimator, params, X_train, y_train, X_test, y_test, folds)
+            for name, estimator, params in expand_candidates(names)
+        ]
+        for future in futures:
+            result, model = future.result()
+            result['data_hash'] = data_hash
+            result['n_samples'] = len(X)
+            results.append(result)
+            models.append(model)
+
+    for result, model in zip(results, models):
+        result.update(profile(model, X_test))
+    return results, models
+
+
+def print_table(results):
+    header = f"{'model':<20} {'params':<52} {'cv acc':>7} {'fit s':>7} {'1-row ms':>9} {'rows/s':>10} {'size KB':>9}"
+    print(header)
+    print('-' * len(header))
+    for result in sorted(results, key=lambda result: -result['cv_accuracy']):
+        params = json.dumps(result['params'])
+        print(f"{result['name']:<20} {params[:52]:<52} {result['cv_accuracy']:>7.4f} "
+              f"{result['fit_seconds']:>7.3f} {result['single_row_latency_ms']:>9.3f} "
+              f"{result['batch_rows_per_second']:>10} {result['artifact_bytes'] / 1024:>9.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cross-validated model search with production profiling")
+    parser.add_argument('--data', default=DEFAULT_DATA_PATH, help="Path to Crop_recommendation.csv")
+    parser.add_argument('--models', nargs='*', choices=sorted(CANDIDATES), help="Candidates to evaluate")
+    parser.add_argument('--jobs', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--max-latency-ms', type=float, default=None)
+    parser.add_argument('--max-artifact-kb', type=float, default=None)
+    parser.add_argument('--min-accuracy', type=float, default=None)
+    parser.add_argument('--report', help="Write all results as JSON to this path")
+    parser.add_argument('--register', metavar='MODELS_DIR',
+                        help="Register the selected model in this model registry (e.g. backend/models)")
+    args = parser.parse_args()
+
+    results, models = run_benchmark(args.data, args.models, args.jobs, args.folds)
+    print_table(results)
+
+    selected = select_model(
+        results, args.max_latency_ms,
+        args.max_artifact_kb * 1024 if args.max_artifact_kb is not None else None,
+        args.min_accuracy)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'results': results, 'selected': selected}, f, indent=2)
+
+    if selected is None:
+        raise SystemExit("No candidate meets the requested limits")
+    print(f"\nSelected: {selected['name']} {json.dumps(selected['params'])}")
+
+    if args.register:
+        from model_registry import ModelRegistry
+        meta = {
+            'accuracy': selected['holdout_accuracy'],
+            'training_seconds': selected['fit_seconds'],
+            **selected,
+        }
+        version = ModelRegistry(args.register).register(models[results.index(selected)], meta)
+        print(f"Registered as {version}")
@@ -1,16 +1,27 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import os
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
 # MUST be the first Streamlit command
 st.set_page_config(page_title="🌾 Smart Crop Selector", layout="wide")
 
+CATALOG_PATH = "merged_hybrid_crops.csv"
+
+# Changes whenever the catalog file is replaced, so cached data follows reloads
+def catalog_stamp():
+    try:
+        stat = os.stat(CATALOG_PATH)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
 # Load and preprocess data
 @st.cache_data
-def load_data():
+def load_data(stamp):
     try:
-        df = pd.read_csv("merged_hybrid_crops.csv")
+        df = pd.read_csv(CATALOG_PATH)
 
         # Data cleaning
         df = df.drop_duplicates(subset=["Crop", "Hybrid"])
@@ -37,32 +48,57 @@ def load_data():
         return pd.DataFrame(columns=required_columns)
 
 with st.spinner('Loading crop data...'):
-    df = load_data()
+    stamp = catalog_stamp()
+    df = load_data(stamp)
 
-# Train simple recommendation model
+# TF-IDF index of the catalog, built once per catalog file and shared by every
+# rerun and session. Rows are L2-normalized by the vectorizer, so cosine
+# similarity is a sparse dot product; row positions are grouped by crop.
 @st.cache_resource
-def train_model(data):
+def build_index(stamp):
     vectorizer = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = vectorizer.fit_transform(data)
-    return vectorizer, tfidf_matrix
+    tfidf_matrix = vectorizer.fit_transform(df["Search_Features"])
+    crop_rows = {crop: rows for crop, rows in df.groupby("Crop", sort=False).indices.items()}
+    return vectorizer, tfidf_matrix.tocsr(), crop_rows
 
 if not df.empty:
-    vectorizer, tfidf_matrix = train_model(df["Search_Features"])
+    vectorizer, tfidf_matrix, crop_rows = build_index(stamp)
 
 # Recommendation engine
-def get_recommendations(user_input, selected_crop):
-    try:
-        if selected_crop != "All":
-            crop_filtered_df = df[df["Crop"] == selected_crop]
-        else:
-            crop_filtered_df = df.copy()
-
-        query_vec = vectorizer.transform([user_input])
-        similarities = cosine_similarity(query_vec,
-                                         vectorizer.transform(crop_filtered_df["Search_Features"])).flatten()
+# Top-k results per normalized query, crop and region, shared across reruns and
+# sessions. Bounded LRU with a TTL; the catalog stamp is part of the key, so a
+# reloaded catalog never serves results scored against the old one.
+@st.cache_data(max_entries=256, ttl=3600, show_spinner=False)
+def score_recommendations(query, selected_crop, selected_region, top_k, stamp):
+    if selected_crop != "All":
+        rows = crop_rows.get(selected_crop, np.empty(0, dtype=int))
+    else:
+        rows = np.arange(len(df))
+    if selected_region != "All":
+        rows = rows[df["Region"].iloc[rows].str.contains(selected_region, case=False, regex=False).to_numpy()]
+
+    # Only the query is transformed; catalog rows come from the cached index
+    query_vec = vectorizer.transform([query])
+    similarities = (tfidf_matrix[rows] @ query_vec.T).toarray().ravel()
+
+    # Partial selection of the top_k scores, then sort only those: score
+    # descending, catalog order on ties (as the recommendation API does)
+    n, k = len(similarities), min(top_k, len(similarities))
+    if k:
+        kth = np.partition(similarities, n - k)[n - k]
+        above = np.flatnonzero(similarities > kth)
+        ties = np.flatnonzero(similarities == kth)[:k - len(above)]
+        best = np.r_[above, ties]
+        best = best[np.lexsort((best, -similarities[best]))]
+    else:
+        best = np.empty(0, dtype=int)
+    return df.iloc[rows[best]].assign(Match_Score=similarities[best])
 
-        crop_filtered_df["Match_Score"] = similarities
-        return crop_filtered_df.sort_values("Match_Score", ascending=False)
+def get_recommendations(user_input, selected_crop, selected_region="All", top_k=5):
+    try:
+        # TF-IDF lowercases and tokenizes on words, so case and spacing never change results
+        query = " ".join(user_input.lower().split())
+        return score_recommendations(query, selected_crop, selected_region, top_k, stamp)
     except Exception as e:
         st.error(f"Recommendation error: {str(e)}")
         return pd.DataFrame()
@@ -94,7 +130,7 @@ with tab1:
             "Disease Resistance": "disease resistant",
             "Early Maturity": "early maturity"
         }
-        recommendations = get_recommendations(query_map[priority], crop).head(5)
+        recommendations = get_recommendations(query_map[priority], crop, region, top_k=5)
 
         if not recommendations.empty:
             for _, row in recommendations.iterrows():
@@ -134,7 +170,7 @@ with tab2:
         if crop != "All":
             filtered_df = filtered_df[filtered_df["Crop"] == crop]
         if region != "All":
-            filtered_df = filtered_df[filtered_df["Region"].str.contains(region, case=False)]
+            filtered_df = filtered_df[filtered_df["Region"].str.contains(region, case=False, regex=False)]
 
     if not filtered_df.empty:
         compare_options = st.multiselect(